@@ -217,21 +217,6 @@ CLOUD1 = [
     [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
 ]
 
-CLOUD2 = [
-    [0,0,0,0,0,0,0,0,0,1,1,1,1,0,0,0],  # noqa
-    [0,0,0,1,1,1,0,1,1,1,1,1,1,1,0,0],  # noqa
-    [0,0,1,1,1,1,1,1,1,1,1,1,1,1,0,0],  # noqa
-    [0,1,1,1,1,1,1,1,1,1,1,1,1,1,1,0],  # noqa
-    [0,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],  # noqa
-    [0,1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],  # noqa
-    [0,0,1,1,1,1,1,1,1,0,0,0,1,1,1,0],  # noqa
-    [0,0,0,0,1,1,1,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-]
-
 CLOUD3 = [
     [0,0,0,0,0,0,0,0,1,1,1,1,0,0,0],  # noqa
     [0,0,1,1,1,0,1,1,1,1,1,1,1,0,0],  # noqa
@@ -247,24 +232,7 @@ CLOUD3 = [
     [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
 ]
 
-CLOUD4 = [
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,1,1,1,1,0,0,0],  # noqa
-    [0,0,1,1,1,0,1,1,1,1,1,1,1,0,0],  # noqa
-    [0,1,1,1,1,1,1,1,1,1,1,1,1,0,0],  # noqa
-    [1,1,1,1,1,1,1,1,1,1,1,1,1,1,0],  # noqa
-    [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],  # noqa
-    [1,1,1,1,1,1,1,1,1,1,1,1,1,1,1],  # noqa
-    [0,1,1,1,1,1,1,1,0,0,0,1,1,1,0],  # noqa
-    [0,0,0,1,1,1,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-    [0,0,0,0,0,0,0,0,0,0,0,0,0,0,0],  # noqa
-]
-
 CLOUDY_ANIMATION = (CLOUD1, )
-CLOUDY_ANIMATION_LATERAL = (CLOUD2, CLOUD1, CLOUD1, CLOUD2)
-CLOUDY_ANIMATION_UP_DOWN = (CLOUD3, CLOUD3, CLOUD4, CLOUD4)
 
 RAIN_CLOUD_1 = [
     [0,0,0,0,0,0,0,0,1,1,1,1,0,0,0],  # noqa
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sys
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler
+from BaseHTTPServer import HTTPServer
+from email.utils import formatdate
+
+import requests
+
+from clockpi.external import APIClient
+from clockpi.shared_state import LocalStateChannel
+
+
+# When the stub forecast starts, so it's the same every time
+STUB_TIMESTAMP = 1500000000
+STUB_ETAG = '"clockpi-stub"'
+STUB_LAST_MODIFIED = formatdate(STUB_TIMESTAMP, usegmt=True)
+# Hours in the forecast, about as many as weather.gov sends
+STUB_FORECAST_HOURS = 156
+VALIDATORS = ('etag', 'last_modified')
+
+
+def stub_forecast(hours=STUB_FORECAST_HOURS):
+    """Returns JSON shaped like weather.gov's hourly forecast"""
+    periods = []
+    for hour in xrange(hours):
+        periods.append({
+            'number': hour + 1,
+            'startTime': formatdate(STUB_TIMESTAMP + hour * 3600),
+            'isDaytime': 6 <= hour % 24 < 20,
+            'temperature': 60 + hour % 10,
+            'temperatureUnit': 'F',
+            'windSpeed': '10 mph',
+            'windDirection': 'W',
+            'icon': 'https://api.weather.gov/icons/land/day/rain_showers,20'
+                    '?size=small',
+            'shortForecast': 'Chance Rain Showers',
+            'detailedForecast': '',
+        })
+    return {'properties': {'periods': periods}}
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests += 1
+        if ((server.validator == 'etag' and
+             self.headers.get('If-None-Match') == STUB_ETAG) or
+                (server.validator == 'last_modified' and
+                 self.headers.get('If-Modified-Since') ==
+                 STUB_LAST_MODIFIED)):
+            server.not_modified += 1
+            server.body_bytes.append(0)
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/geo+json')
+        self.send_header('Content-Length', str(len(server.body)))
+        if server.validator == 'etag':
+            self.send_header('ETag', STUB_ETAG)
+        else:
+            self.send_header('Last-Modified', STUB_LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(server.body)
+        server.body_bytes.append(len(server.body))
+
+    def log_message(self, format, *args):
+        # Every request would be printed to stderr otherwise
+        pass
+
+
+class StubAPIServer(HTTPServer):
+    """
+    Serves `body` as JSON on localhost along with one of the `VALIDATORS`,
+    and answers 304 Not Modified to requests that send it back, the way the
+    weather API does. Runs on a thread, so the API clients can be pointed at
+    it without a network. The size of the body sent for each request is
+    kept in `body_bytes`.
+    """
+    def __init__(self, body, validator='etag'):
+        if validator not in VALIDATORS:
+            raise ValueError("Unknown validator {}".format(validator))
+        HTTPServer.__init__(self, ('127.0.0.1', 0), StubAPIHandler)
+        self.body = json.dumps(body)
+        self.validator = validator
+        self.requests = 0
+        self.not_modified = 0
+        self.body_bytes = []
+        self.thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/forecast/hourly'.format(
+            self.server_address[1])
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def check_revalidation(server, fetches=20):
+    """
+    Fetches from `server` `fetches` times through `APIClient.get_json`,
+    counting the times the response is parsed as JSON. Returns a dict with
+    how many of the fetches after the first came back modified, how many
+    parses there were, and whether every fetch returned the same JSON.
+    """
+    parses = [0]
+    parse_json = requests.Response.json
+
+    def counting_json(response, **kwargs):
+        parses[0] += 1
+        return parse_json(response, **kwargs)
+
+    client = APIClient(LocalStateChannel(()))
+    # Don't send requests for localhost to a proxy
+    client.session.trust_env = False
+    requests.Response.json = counting_json
+    try:
+        first_json, _ = client.get_json(server.url)
+        modified = 0
+        same_json = True
+        for _ in xrange(fetches - 1):
+            response_json, is_modified = client.get_json(server.url)
+            modified += is_modified
+            same_json &= response_json == first_json
+    finally:
+        requests.Response.json = parse_json
+    return {
+        'modified': modified,
+        'parses': parses[0],
+        'same_json': same_json,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks that API responses are revalidated against a '
+                    'local stub server instead of downloaded and parsed '
+                    'again')
+    parser.add_argument('--fetches', type=int, default=20)
+    parser.add_argument('--hours', type=int, default=STUB_FORECAST_HOURS,
+                        help='Hours in the stub forecast, for its size')
+    args = parser.parse_args()
+
+    failed = False
+    for validator in VALIDATORS:
+        server = StubAPIServer(stub_forecast(args.hours), validator)
+        server.start()
+        try:
+            result = check_revalidation(server, args.fetches)
+        finally:
+            server.stop()
+        revalidated_bytes = sum(server.body_bytes[1:])
+        ok = (result['modified'] == 0 and result['parses'] == 1 and
+              result['same_json'] and
+              server.not_modified == args.fetches - 1 and
+              revalidated_bytes == 0)
+        failed |= not ok
+        print('{}: {}, {} requests, {} not modified, {} JSON parses, body '
+              'bytes sent {} for the first fetch and {} for the other '
+              '{}'.format(
+                  validator, 'ok' if ok else 'FAILED', server.requests,
+                  server.not_modified, result['parses'],
+                  server.body_bytes[0], revalidated_bytes,
+                  args.fetches - 1))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import timeit
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+
+from clockpi.alphanum import numbers_large
+from clockpi.clockface_config import BACKGROUNDS
+from clockpi.clockface_config import PLAIN_CLOCKFACE
+from clockpi.clockface_config import TRAFFIC_CLOCKFACE
+from clockpi.clockface_config import WEATHER_ANIMATIONS
+from clockpi.display import FakeFrameCanvas
+from clockpi.display import FakeRGBMatrix
+from clockpi.display import MatrixDisplay
+from clockpi.graphics.graphics import LEDPi
+from clockpi.graphics.render_plan import config_to_matrix
+from clockpi.graphics.utils import add_to_matrix
+from clockpi.graphics.utils import generate_empty_matrix
+from clockpi.update_clock_info import update_color
+from clockpi.update_clock_info import update_time
+from clockpi.utils import send_matrix
+
+
+# Every benchmark sees the same clock and data, so results from different
+# commits can be compared
+BENCHMARK_TIME = datetime(2019, 6, 14, 8, 45, 59)
+BENCHMARK_TIMESTAMP = 1560527159.0
+BENCHMARK_SEED = 1
+BLEND_MODES = (
+    ('or', {'bit_or': True}),
+    ('and', {'bit_or': False, 'bit_and': True}),
+    ('xor', {'bit_or': False, 'bit_xor': True}),
+    ('overwrite', {'bit_or': False}),
+)
+# The numpy functions that make new arrays, which are counted as
+# allocations while benchmarking, see `count_allocations`
+ALLOCATING_FUNCTIONS = (
+    'arange', 'array', 'asarray', 'clip', 'concatenate', 'copy', 'empty',
+    'empty_like', 'flatnonzero', 'full', 'ones', 'ones_like', 'pad', 'roll',
+    'stack', 'where', 'zeros', 'zeros_like',
+)
+
+
+def benchmark_data(forecast_key=None, show_traffic=False):
+    """Returns clock info like `ClockInfoUpdater` makes, at `BENCHMARK_TIME`"""
+    data = {
+        'weather': {
+            'current_temp': 72,
+            'sunrise': BENCHMARK_TIME.replace(hour=5, minute=48),
+            'sunset': BENCHMARK_TIME.replace(hour=20, minute=35),
+        },
+        'temp_digits': [7, 2],
+        'forecast_key': forecast_key,
+        'show_traffic': show_traffic,
+        'traffic': {'traffic_delta': 3, 'travel_time': 27},
+        'traffic_delta_digits': [0, 3],
+        'travel_time_digits': [2, 7],
+    }
+    update_time(data, BENCHMARK_TIME)
+    update_color(data, BENCHMARK_TIME)
+    return data
+
+
+class FixedClockInfoUpdater(object):
+    """Stands in for `ClockInfoUpdater`, always giving the same data"""
+    def __init__(self, data):
+        self.fixed_data = data
+
+    def data_connections(self, clock_info):
+        return []
+
+    def run(self, clock_info, update_freq):
+        clock_info.clear()
+        clock_info.update(self.fixed_data)
+        return True
+
+
+class FrameClock(object):
+    """
+    A clock that moves forward by `step` seconds every time it's read, so
+    animations advance the same way on every run.
+    """
+    def __init__(self, start=BENCHMARK_TIMESTAMP, step=1.0):
+        self.current_time = start
+        self.step = step
+
+    def __call__(self):
+        self.current_time += self.step
+        return self.current_time
+
+
+def time_per_call(func, number, repeat):
+    """Returns the best time per call of `func` in microseconds"""
+    timer = timeit.Timer(func)
+    return min(timer.repeat(repeat, number)) / number * 1e6
+
+
+@contextmanager
+def count_allocations():
+    """
+    Counts the arrays made by calls to the `ALLOCATING_FUNCTIONS` through the
+    numpy module while in the context. Yields a dict with the number of
+    'arrays' and their total 'bytes'. Python 2 has no tracemalloc, so arrays
+    made by operators and by array methods (like `astype`) aren't counted,
+    and neither are temporary ones made inside of these functions.
+    """
+    counts = {'arrays': 0, 'bytes': 0}
+    depth = [0]
+
+    def counting(func):
+        def counting_func(*args, **kwargs):
+            depth[0] += 1
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                depth[0] -= 1
+            if (not depth[0] and isinstance(result, np.ndarray) and
+                    result.flags.owndata and
+                    not any(result is arg for arg in args)):
+                counts['arrays'] += 1
+                counts['bytes'] += result.nbytes
+            return result
+        return counting_func
+
+    originals = dict((name, getattr(np, name))
+                     for name in ALLOCATING_FUNCTIONS)
+    for name, func in originals.iteritems():
+        setattr(np, name, counting(func))
+    try:
+        yield counts
+    finally:
+        for name, func in originals.iteritems():
+            setattr(np, name, func)
+
+
+def get_benchmarks():
+    """Returns a list of (name, func), where `func` draws one frame's worth"""
+    benchmarks = [('generate_empty_matrix', generate_empty_matrix)]
+
+    weather_matrix = config_to_matrix(
+        WEATHER_ANIMATIONS['cloudy_sun'], {}, brightness=40,
+        current_time=BENCHMARK_TIMESTAMP)
+    clockface = config_to_matrix(PLAIN_CLOCKFACE, benchmark_data(),
+                                 color=[50, 40, 30],
+                                 current_time=BENCHMARK_TIMESTAMP)
+    glyph = numbers_large.ALL_NUMBERS[8]
+    for mode_name, mode_kwargs in BLEND_MODES:
+        for mask in (False, True):
+            suffix = '{}{}'.format(mode_name, '/mask' if mask else '')
+            matrix = weather_matrix.copy()
+
+            def add_glyph(matrix=matrix, mode_kwargs=mode_kwargs, mask=mask):
+                add_to_matrix(glyph, matrix, 30, 9, color=[50, 40, 30],
+                              mask=mask, **mode_kwargs)
+
+            def add_layer(matrix=matrix, mode_kwargs=mode_kwargs, mask=mask):
+                add_to_matrix(clockface, matrix, 0, 0, transpose=False,
+                              mask=mask, **mode_kwargs)
+            benchmarks.append(('add_to_matrix/glyph/' + suffix, add_glyph))
+            benchmarks.append(('add_to_matrix/layer/' + suffix, add_layer))
+
+    clockfaces = [('plain', PLAIN_CLOCKFACE, benchmark_data()),
+                  ('traffic', TRAFFIC_CLOCKFACE,
+                   benchmark_data(show_traffic=True))]
+    for name, config, data in clockfaces:
+        def draw_clockface(config=config, data=data, clock=FrameClock()):
+            config_to_matrix(config, data, color=data['color'],
+                             current_time=clock())
+        benchmarks.append(('config_to_matrix/' + name, draw_clockface))
+    for forecast_key in sorted(WEATHER_ANIMATIONS):
+        data = benchmark_data(forecast_key)
+
+        def draw_weather(config=WEATHER_ANIMATIONS[forecast_key], data=data,
+                         clock=FrameClock()):
+            config_to_matrix(config, data, brightness=data['brightness'],
+                             default_color=data['color'],
+                             current_time=clock(), bit_or=False)
+        benchmarks.append(('config_to_matrix/weather/' + forecast_key,
+                           draw_weather))
+
+    scenarios = [('plain', benchmark_data()),
+                 ('traffic', benchmark_data(show_traffic=True)),
+                 ('rain', benchmark_data('rain')),
+                 ('cloudy_sun', benchmark_data('cloudy_sun'))]
+    for name, data in scenarios:
+        ledpi = LEDPi(clock_info_updater=FixedClockInfoUpdater(data))
+
+        def display_clock(ledpi=ledpi, clock=FrameClock()):
+            ledpi.display_clock(current_time=clock())
+        benchmarks.append(('display_clock/' + name, display_clock))
+    for background in sorted(BACKGROUNDS):
+        ledpi = LEDPi(clock_info_updater=FixedClockInfoUpdater(
+            benchmark_data()), background=background)
+
+        def display_clock(ledpi=ledpi, clock=FrameClock(step=0.25)):
+            ledpi.display_clock(current_time=clock())
+        benchmarks.append(('display_clock/background/' + background,
+                           display_clock))
+
+    frames = [clockface, weather_matrix]
+    display = MatrixDisplay(FakeRGBMatrix())
+
+    def send_changed_matrix():
+        # Alternates between frames, so every one has to be pushed
+        display.send_matrix(frames[display.frames_sent % 2])
+
+    def send_unchanged_matrix():
+        display.send_matrix(clockface)
+
+    canvas = FakeFrameCanvas()
+    benchmarks.append(('send_matrix/changed', send_changed_matrix))
+    benchmarks.append(('send_matrix/unchanged', send_unchanged_matrix))
+    benchmarks.append(('utils.send_matrix',
+                       lambda: send_matrix(canvas, clockface)))
+    return benchmarks
+
+
+def run_benchmarks(benchmarks, number=200, repeat=5):
+    """
+    Runs each benchmark after a warm up call, so caches are in the state
+    they'd be in while the clock is running. Returns a dict of name -> [per
+    call microseconds, arrays allocated per call, KiB allocated per call].
+    Allocations are counted over another `number` calls, since counting
+    them slows the calls down.
+    """
+    results = {}
+    for name, func in benchmarks:
+        np.random.seed(BENCHMARK_SEED)
+        func()
+        micros = time_per_call(func, number, repeat)
+        with count_allocations() as counts:
+            for _ in xrange(number):
+                func()
+        results[name] = [micros, float(counts['arrays']) / number,
+                         counts['bytes'] / 1024.0 / number]
+    return results
+
+
+def format_results(benchmarks, results, baseline=None):
+    lines = ['{:<36} {:>10} {:>9} {:>8} {:>8}'.format(
+             'benchmark', 'us/frame', 'change', 'arrays', 'KiB')]
+    for name, _ in benchmarks:
+        micros, arrays, kib = results[name]
+        change = ''
+        if baseline and name in baseline:
+            baseline_micros = baseline[name]
+            if isinstance(baseline_micros, list):
+                baseline_micros = baseline_micros[0]
+            change = '{:+.1f}%'.format((micros / baseline_micros - 1) * 100)
+        lines.append('{:<36} {:>10.1f} {:>9} {:>8.1f} {:>8.1f}'.format(
+                     name, micros, change, arrays, kib))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmarks the render pipeline')
+    parser.add_argument('--number', type=int, default=200,
+                        help='Calls per timing run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Timing runs, of which the best is kept')
+    parser.add_argument('--filter', default='',
+                        help='Only run benchmarks with this in their name')
+    parser.add_argument('--output', help='Save the results as JSON')
+    parser.add_argument('--baseline',
+                        help='Compare with results saved with --output')
+    args = parser.parse_args()
+
+    benchmarks = [(name, func) for name, func in get_benchmarks()
+                  if args.filter in name]
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+    results = run_benchmarks(benchmarks, args.number, args.repeat)
+    print(format_results(benchmarks, results, baseline))
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(results, output_file, indent=2, sort_keys=True)
@@ -0,0 +1,37 @@
+import time
+from datetime import datetime
+from datetime import timedelta
+
+
+class SystemClock(object):
+    """The wall clock. `time` is a timestamp and `now` is a local datetime."""
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+
+class SimulatedClock(object):
+    """
+    A clock that only moves when it's told to, so a day can be drawn as fast
+    as frames can be rendered. Starts at the local datetime `start`.
+    """
+    def __init__(self, start):
+        self.current = start
+
+    def time(self):
+        return (time.mktime(self.current.timetuple()) +
+                self.current.microsecond / 1e6)
+
+    def now(self):
+        return self.current
+
+    def set(self, current):
+        self.current = current
+
+    def advance(self, seconds):
+        self.current += timedelta(seconds=seconds)
+
+
+SYSTEM_CLOCK = SystemClock()
@@ -6,6 +6,10 @@ from clockpi.alphanum import numbers_large
 from clockpi.alphanum import numbers_small
 from clockpi.alphanum import numbers_tiny
 from clockpi.alphanum import weather_animations
+from clockpi.constants import ARRAY_HEIGHT
+from clockpi.constants import ARRAY_WIDTH
+from clockpi.graphics.tween import Tween
+from clockpi.procedural_animations import GameOfLife
 from clockpi.procedural_animations import ProceduralRain
 
 
@@ -26,6 +30,10 @@ used. Not all of the following keys are required.
 - font_choices: an iterable of `font`s that get tried in order to be used, for
     example, if a number display should also sometimes be able to show letters
 - color: a custom RGB color (0-255)
+- motion: a `Tween` that moves an item or animation around, which can put it
+    between pixels
+- fps: how many times a second `motion` moves the item (`ANIMATION_FPS` by
+    default)
 
 Put the word 'animation' in the key for that item to be handled as an
 animation, which means you don't need to include a `data_key`.
@@ -79,7 +87,10 @@ WEATHER_ANIMATIONS = {
                 'center_x': 14,
                 'center_y': 14,
             },
-            'font': weather_animations.CLOUDY_ANIMATION_LATERAL,
+            'item': weather_animations.CLOUD1,
+            # Drifts a pixel to the left and back
+            'motion': Tween([(0, (1, 0)), (1, (0, 0)), (2, (0, 0)),
+                             (3, (1, 0))], period=4),
             'color': CLOUD_COLOR,
             'mask': True,
          }),
@@ -88,7 +99,10 @@ WEATHER_ANIMATIONS = {
                 'center_x': 24,
                 'center_y': 12,
             },
-            'font': weather_animations.CLOUDY_ANIMATION_UP_DOWN,
+            'item': weather_animations.CLOUD3,
+            # Bobs a pixel down and back up
+            'motion': Tween([(0, (0, 0)), (1, (0, 0)), (2, (0, 1)),
+                             (3, (0, 1))], period=4),
             'color': CLOUD_COLOR,
             'mask': True,
          }),
@@ -118,7 +132,7 @@ WEATHER_ANIMATIONS = {
                 'origin_x': 1,
                 'origin_y': 6,
             },
-            'procedural_animation': ProceduralRain(38, 32),
+            'procedural_animation': ProceduralRain(38, 32, speed=4),
             'color': [30, 172, 255],
         }),
         ('cloud_1', {
@@ -137,7 +151,7 @@ WEATHER_ANIMATIONS = {
                 'origin_x': 1,
                 'origin_y': 6,
             },
-            'procedural_animation': ProceduralRain(38, 32),
+            'procedural_animation': ProceduralRain(38, 32, speed=4),
             'color': [30, 172, 255],
         }),
         ('cloud_1', {
@@ -160,6 +174,21 @@ WEATHER_ANIMATIONS = {
     )),
 }
 
+# Backgrounds that can be drawn behind everything else. The clockface's mask
+# keeps the digits readable on top of them.
+BACKGROUNDS = {
+    'game_of_life': {
+        'life_animation': {
+            'spatial': {
+                'origin_x': 0,
+                'origin_y': 0,
+            },
+            'procedural_animation': GameOfLife(ARRAY_WIDTH, ARRAY_HEIGHT),
+            'color': [60, 20, 90],
+        },
+    },
+}
+
 PLAIN_CLOCKFACE = {
     'hour_digits': {
         'data_key': 'hour_digits',
@@ -1,3 +1,5 @@
+import os
+
 from clockpi.enums import WeatherType
 
 
@@ -18,7 +20,33 @@ DAILY_BRIGHTNESS_MIN = 1
 DAILY_BRIGHTNESS_MAX = 40
 GLOBAL_BRIGHTNESS_MIN = 2
 SUN_ANIMATION_DURATION = 600  # Seconds
+# A key of `clockface_config.BACKGROUNDS` to draw behind the clock, or None
+CLOCKFACE_BACKGROUND = None
+BACKGROUND_BRIGHTNESS = 0.3  # Fraction of the clockface's brightness
+# Compare the calculated sunrise/sunset with the astro API's (just logs it)
+SUN_TIMES_CROSS_CHECK = False
+MAX_FPS = 30  # Upper limit on how often the display gets redrawn
+# Frame rate of tweened sprite motion, unless a group sets its own 'fps'
+ANIMATION_FPS = 20
+SUBPIXEL_STEPS = 8  # Positions per pixel that tweened sprites can be drawn at
+# How late a frame can be drawn before it counts as a missed deadline
+DEADLINE_MISS_TOLERANCE = 0.05  # Seconds
+METRICS_WINDOW = 600  # Number of frames that timing percentiles cover
+METRICS_EXPORT_INTERVAL = 60  # Seconds
+GLYPH_TINT_CACHE_SIZE = 256  # Number of colored glyphs to keep around
+# Number of rendered clockface groups to keep around. Layers don't depend on
+# color, so this covers a layer for every second, minute and hour, plus the
+# temperature, traffic and weather layers (and their in-between positions).
+LAYER_CACHE_SIZE = 256
+BRIGHTNESS_LUT_CACHE_SIZE = 8  # Number of brightness lookup tables to keep
 WEATHER_FORECAST_HOURS = 8  # Number of hours ahead to show the forecast for
+# Run the API clients in a 'process' each, or all on one 'thread' in the
+# renderer's process, which takes less memory
+API_FETCH_MODE = 'process'
+API_CONNECT_TIMEOUT = 5  # Seconds
+API_READ_TIMEOUT = 15  # Seconds
+# Where API results are saved so they can be used right away after a restart
+API_CACHE_DIR = os.path.expanduser('~/.cache/ledpi')
 # Lookup to simplify down the possible weather forecasts
 W_GOV_ICON_2_WEATHER = {
     # List: https://api.weather.gov/icons
@@ -0,0 +1,263 @@
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+from clockpi.constants import ARRAY_HEIGHT
+from clockpi.constants import ARRAY_WIDTH
+
+
+class Display(object):
+    """
+    Somewhere to send matrices to. Frames that are identical to the one
+    already being displayed are skipped, since pushing a frame out is the most
+    expensive part of displaying it. Subclasses implement `show`, which gets
+    the frame as a contiguous (height, width, 3) buffer in image order.
+    """
+    def __init__(self, width=ARRAY_WIDTH, height=ARRAY_HEIGHT):
+        self.width = width
+        self.height = height
+        # The matrix is indexed [x][y], but images are indexed [y][x], so
+        # keep a contiguous buffer in image order to show frames from
+        self.buffer = np.zeros((height, width, 3), dtype=np.uint8)
+        self.buffer_on_screen = False  # Whether `buffer` is being displayed
+        self.frames_sent = 0
+        self.frames_skipped = 0
+
+    def send_matrix(self, matrix):
+        """Displays `matrix`. Returns False if it was already on screen."""
+        frame = matrix.swapaxes(0, 1)
+        if self.buffer_on_screen and np.array_equal(self.buffer, frame):
+            self.frames_skipped += 1
+            return False
+        np.copyto(self.buffer, frame)
+        self.show(self.buffer)
+        self.buffer_on_screen = True
+        self.frames_sent += 1
+        return True
+
+    def show(self, frame):
+        raise NotImplementedError()
+
+    def clear(self):
+        self.buffer_on_screen = False
+
+    def close(self):
+        """Finishes off any output once there are no more frames"""
+        pass
+
+
+class MatrixDisplay(Display):
+    """
+    Pushes matrices to an rgbmatrix driver using its offscreen canvas, so a
+    frame is drawn off screen and swapped in on the next vsync instead of
+    clearing and redrawing the visible canvas.
+    """
+    def __init__(self, driver, width=ARRAY_WIDTH, height=ARRAY_HEIGHT):
+        super(MatrixDisplay, self).__init__(width, height)
+        self.driver = driver
+        self.canvas = driver.CreateFrameCanvas()
+        self.image = Image.new('RGB', (width, height))
+
+    def show(self, frame):
+        self.image.frombytes(frame)
+        self.canvas.SetImage(self.image, 0, 0)
+        # The canvas that was on screen is handed back to draw the next frame
+        self.canvas = self.driver.SwapOnVSync(self.canvas)
+
+    def clear(self):
+        super(MatrixDisplay, self).clear()
+        self.canvas.Clear()
+        self.canvas = self.driver.SwapOnVSync(self.canvas)
+
+
+class NullDisplay(Display):
+    """Throws frames away, for running and profiling without any output"""
+    def show(self, frame):
+        pass
+
+
+class FrameDumpDisplay(Display):
+    """
+    Writes every frame to `directory`, numbered in order, either as PNGs or
+    as raw RGB bytes (`height` rows of `width` pixels) if `image_format` is
+    'raw'.
+    """
+    def __init__(self, directory, image_format='png', width=ARRAY_WIDTH,
+                 height=ARRAY_HEIGHT):
+        super(FrameDumpDisplay, self).__init__(width, height)
+        if image_format not in ('png', 'raw'):
+            raise ValueError("Unknown frame dump format {}".format(
+                             image_format))
+        self.directory = directory
+        self.image_format = image_format
+        self.image = Image.new('RGB', (width, height))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def frame_path(self, frame_number):
+        return os.path.join(self.directory, 'frame_{:06d}.{}'.format(
+                            frame_number, self.image_format))
+
+    def show(self, frame):
+        path = self.frame_path(self.frames_sent)
+        if self.image_format == 'png':
+            self.image.frombytes(frame)
+            self.image.save(path)
+        else:
+            with open(path, 'wb') as raw_file:
+                raw_file.write(frame.tobytes())
+
+
+class GifDisplay(Display):
+    """
+    Collects frames into an animated GIF, which is written to `path` on
+    `close`. Each frame is shown for `frame_duration` milliseconds, and
+    unchanged frames make the one before last longer instead of being added
+    again. Frames are scaled up `scale` times, since the matrix is tiny.
+    Every frame is kept in memory until then, scaled up while saving.
+    """
+    def __init__(self, path, frame_duration=50, scale=1, width=ARRAY_WIDTH,
+                 height=ARRAY_HEIGHT):
+        super(GifDisplay, self).__init__(width, height)
+        self.path = path
+        self.frame_duration = frame_duration
+        self.scale = scale
+        self.frames = []
+        self.durations = []
+
+    def send_matrix(self, matrix):
+        sent = super(GifDisplay, self).send_matrix(matrix)
+        if not sent:
+            self.durations[-1] += self.frame_duration
+        return sent
+
+    def show(self, frame):
+        image = Image.frombytes('RGB', (self.width, self.height),
+                                frame.tobytes())
+        # Paletted frames take a third of the memory, and GIFs need them
+        self.frames.append(image.convert('P', palette=Image.ADAPTIVE))
+        self.durations.append(self.frame_duration)
+
+    def scaled_frames(self):
+        size = (self.width * self.scale, self.height * self.scale)
+        for image in self.frames:
+            yield image.resize(size, Image.NEAREST)
+
+    def close(self):
+        if not self.frames:
+            return
+        # Older versions of Pillow can only append a list
+        frames = list(self.scaled_frames())
+        frames[0].save(self.path, save_all=True, append_images=frames[1:],
+                       duration=self.durations, loop=0)
+
+
+class TerminalDisplay(Display):
+    """
+    Previews frames in a terminal with 24-bit ANSI colors. Each character is
+    an upper half block, so it shows two rows of pixels: the top one in the
+    foreground color and the bottom one in the background color.
+    """
+    HALF_BLOCK = u'\u2580'
+    PIXEL_PAIR = u'\x1b[38;2;{};{};{}m\x1b[48;2;{};{};{}m' + HALF_BLOCK
+    RESET = u'\x1b[0m'
+    CURSOR_HOME = u'\x1b[H'
+    CLEAR_SCREEN = u'\x1b[2J'
+
+    def __init__(self, stream=None, width=ARRAY_WIDTH, height=ARRAY_HEIGHT):
+        super(TerminalDisplay, self).__init__(width, height)
+        self.stream = stream or sys.stdout
+        self.stream.write(self.CLEAR_SCREEN.encode('utf-8'))
+
+    def show(self, frame):
+        if self.height % 2:
+            # Pad with a black row so every row has a partner
+            frame = np.concatenate(
+                (frame, np.zeros((1, self.width, 3), dtype=np.uint8)))
+        lines = []
+        for y in range(0, len(frame), 2):
+            pixel_pairs = np.concatenate((frame[y], frame[y + 1]), axis=1)
+            lines.append(u''.join(self.PIXEL_PAIR.format(*pixel_pair)
+                                  for pixel_pair in pixel_pairs.tolist()) +
+                         self.RESET)
+        self.stream.write((self.CURSOR_HOME + u'\n'.join(lines) +
+                           u'\n').encode('utf-8'))
+        self.stream.flush()
+
+    def clear(self):
+        super(TerminalDisplay, self).clear()
+        self.stream.write((self.CLEAR_SCREEN + self.CURSOR_HOME).encode(
+                          'utf-8'))
+        self.stream.flush()
+
+
+def make_rgbmatrix_driver():
+    # Only available on the Pi, so it's not imported until it's needed
+    from rgbmatrix import RGBMatrix, RGBMatrixOptions
+    options = RGBMatrixOptions()
+    options.rows = 32
+    options.cols = 32
+    options.chain_length = 2
+    options.parallel = 1
+    options.multiplexing = 0
+    options.hardware_mapping = 'adafruit-hat-pwm'
+    return RGBMatrix(options=options)
+
+
+DISPLAY_BACKENDS = ('rgbmatrix', 'null', 'png', 'raw', 'terminal')
+
+
+def make_display(backend, output_dir=None):
+    """Creates the display for one of `DISPLAY_BACKENDS`"""
+    if backend == 'rgbmatrix':
+        return MatrixDisplay(make_rgbmatrix_driver())
+    if backend == 'null':
+        return NullDisplay()
+    if backend in ('png', 'raw'):
+        if output_dir is None:
+            raise ValueError("The {} display needs an output directory".format(
+                             backend))
+        return FrameDumpDisplay(output_dir, image_format=backend)
+    if backend == 'terminal':
+        return TerminalDisplay()
+    raise ValueError("Unknown display backend {}".format(backend))
+
+
+class FakeFrameCanvas(object):
+    """Stands in for an rgbmatrix FrameCanvas"""
+    def __init__(self, width=ARRAY_WIDTH, height=ARRAY_HEIGHT):
+        self.width = width
+        self.height = height
+        self.pixels = np.zeros((height, width, 3), dtype=np.uint8)
+
+    def SetImage(self, image, offset_x=0, offset_y=0):
+        assert image.mode == 'RGB'
+        assert (offset_x, offset_y) == (0, 0)
+        self.pixels[:] = np.asarray(image)
+
+    def Clear(self):
+        self.pixels[:] = 0
+
+
+class FakeRGBMatrix(FakeFrameCanvas):
+    """
+    Stands in for an rgbmatrix RGBMatrix, so frame pushes can be run and
+    measured off of the Pi. Keeps track of the number of canvases created and
+    frames swapped.
+    """
+    def __init__(self, width=ARRAY_WIDTH, height=ARRAY_HEIGHT):
+        super(FakeRGBMatrix, self).__init__(width, height)
+        self.canvases_created = 0
+        self.frames_swapped = 0
+
+    def CreateFrameCanvas(self):
+        self.canvases_created += 1
+        return FakeFrameCanvas(self.width, self.height)
+
+    def SwapOnVSync(self, canvas):
+        # Swap pixel buffers, since the driver itself is the visible canvas
+        self.frames_swapped += 1
+        self.pixels, canvas.pixels = canvas.pixels, self.pixels
+        return canvas
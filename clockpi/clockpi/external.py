@@ -1,42 +1,135 @@
+import cPickle as pickle
 import googlemaps
 import logging
+import os
 import re
 import requests
+import select
+import tempfile
+import threading
 from datetime import datetime
+from datetime import timedelta
 from dateutil import tz
 from dateutil.parser import parse as dateutil_parse
 from urlparse import urlparse
 
+from clockpi.constants import API_CACHE_DIR
+from clockpi.constants import API_CONNECT_TIMEOUT
+from clockpi.constants import API_READ_TIMEOUT
+from clockpi.constants import SUN_TIMES_CROSS_CHECK
 from clockpi.constants import W_GOV_ICON_2_WEATHER
 from clockpi.constants import WEATHER_FORECAST_HOURS
+from clockpi import secret
+from clockpi.enums import WeatherType
 from clockpi.secret import DIRECTIONS_DESTINATION
 from clockpi.secret import DIRECTIONS_ORIGIN
 from clockpi.secret import GMAPS_DIRECTIONS_API_KEY
 from clockpi.secret import ASTRO_API_URL
 from clockpi.secret import W_GOV_WEATHER_URL
+from clockpi.solar import SunTimesTable
 
 
 logger = logging.getLogger(__name__)
 
+# Secret files from before sunrise and sunset were calculated locally don't
+# have the location, in which case they come from the astro API
+LATITUDE = getattr(secret, 'LATITUDE', None)
+LONGITUDE = getattr(secret, 'LONGITUDE', None)
+
 
 class APIClient(object):
     """Base class for an API client.
     """
-    def __init__(self, mp_pipe):
-        """mp_pipe is a multiprocessing pipe used to transfer data.
+    # The keys of `cleaned_data` and their types, see `StateChannel`
+    FIELDS = ()
+
+    def __init__(self, channel):
+        """channel is a `StateChannel` made with `FIELDS`, which the cleaned
+        data is published to. Messages from the renderer arrive on its pipe.
         Make sure to set `cache_minutes` so that you don't go over usage
         limits!
         """
-        self.mp_pipe = mp_pipe
+        self.channel = channel
+        self.mp_pipe = channel.client_pipe
         self.cache_minutes = 10
         self.last_update_time = None  # Datetime object
+        self.next_update_time = None  # Datetime object, None means now
         self.cleaned_data = {}  # Data from the API that has been cleaned
         self.enabled = True  # Won't run if False
+        # Set by `call_api` when the API couldn't be reached or made no sense,
+        # so the result isn't saved as if it were fresh
+        self.call_failed = False
+        # Pooled connections, and validators and JSON from the last response
+        # for each request, see `get_json`
+        self.session = requests.Session()
+        self.http_cache = {}
+
+    @property
+    def cache_path(self):
+        return os.path.join(API_CACHE_DIR,
+                            '{}.pickle'.format(self.__class__.__name__))
+
+    def load_cache(self):
+        """Loads `cleaned_data` saved by `save_cache`, if it's less than
+        `cache_minutes` old and not from a failed call, and publishes it.
+        Returns True if the cache was used.
+        """
+        try:
+            with open(self.cache_path, 'rb') as cache_file:
+                update_time, cleaned_data = pickle.load(cache_file)
+        except Exception:
+            logger.info("No usable cache for {}".format(self))
+            return False
+        next_update_time = update_time + timedelta(minutes=self.cache_minutes)
+        if not (update_time <= datetime.now() < next_update_time):
+            logger.info("Cache for {} has expired".format(self))
+            return False
+        if cleaned_data.get('error'):
+            logger.info("Cache for {} is from a failed call".format(self))
+            return False
+        logger.info("Using cache for {} from {}".format(self, update_time))
+        self.last_update_time = update_time
+        self.next_update_time = next_update_time
+        self.cleaned_data = cleaned_data
+        self.channel.publish(self.cleaned_data)
+        return True
+
+    def save_cache(self):
+        """Saves `cleaned_data` along with the last update time. The file is
+        written next to the cache and renamed over it, so the cache is never
+        left half written.
+        """
+        try:
+            if not os.path.isdir(API_CACHE_DIR):
+                os.makedirs(API_CACHE_DIR)
+            fd, temp_path = tempfile.mkstemp(dir=API_CACHE_DIR)
+            with os.fdopen(fd, 'wb') as temp_file:
+                pickle.dump((self.last_update_time, self.cleaned_data),
+                            temp_file, pickle.HIGHEST_PROTOCOL)
+            os.rename(temp_path, self.cache_path)
+        except Exception:
+            logger.exception('Exception while saving cache for {}'.format(
+                             self))
 
     def run_forever(self):
-        """Calls `run` forever"""
+        """Calls `run` forever, sleeping in between until the next update is
+        due or until a message arrives on the pipe. Starts from the cache if
+        there's a recent enough one.
+        """
+        self.load_cache()
         while True:
             self.run()
+            self.mp_pipe.poll(self.seconds_until_next_update())
+
+    def seconds_until_next_update(self):
+        """Returns the number of seconds until the next update is due, or
+        None if the client is disabled and has to wait for a message.
+        """
+        if not self.enabled:
+            return None
+        if self.next_update_time is None:
+            return 0
+        return max(0, (self.next_update_time - datetime.now()).total_seconds())
 
     def run(self):
         """The method to be called continuously. Handles keeping track of rate
@@ -49,71 +142,198 @@ class APIClient(object):
         if not self.enabled:
             return False
         now = datetime.now()
-        if self.last_update_time:
-            passed_minutes = (now - self.last_update_time).seconds / 60
-        else:
-            passed_minutes = self.cache_minutes
-        if passed_minutes >= self.cache_minutes:
+        if self.next_update_time is None or now >= self.next_update_time:
             self.last_update_time = now
+            self.next_update_time = now + timedelta(
+                minutes=self.cache_minutes)
             logger.info("Calling API client {}".format(self))
+            self.call_failed = False
             new_data = self.call_api()
             self.cleaned_data.update(new_data)
-            self.mp_pipe.send(self.cleaned_data)
+            self.channel.publish(self.cleaned_data)
+            if not self.call_failed:
+                # A restart should call the API again instead of waiting out
+                # a failure
+                self.save_cache()
             return True
         return False
 
+    def get_json(self, url, params=None, session=None):
+        """GETs JSON from `url` over `session`, the client's session by
+        default. If the last response for this request had an ETag or
+        Last-Modified header, the request is made conditional. Returns
+        (json, is_modified), where on a 304 the JSON from the last response is
+        reused without parsing anything.
+        """
+        cache_key = (url, tuple(sorted((params or {}).items())))
+        headers = {}
+        cached = self.http_cache.get(cache_key)
+        if cached:
+            validators, cached_json = cached
+            if 'ETag' in validators:
+                headers['If-None-Match'] = validators['ETag']
+            if 'Last-Modified' in validators:
+                headers['If-Modified-Since'] = validators['Last-Modified']
+        response = (session or self.session).get(
+            url, params=params, headers=headers,
+            timeout=(API_CONNECT_TIMEOUT, API_READ_TIMEOUT))
+        if cached and response.status_code == 304:
+            return cached_json, False
+        response.raise_for_status()
+        response_json = response.json()
+        validators = dict((header, response.headers[header])
+                          for header in ('ETag', 'Last-Modified')
+                          if header in response.headers)
+        self.http_cache[cache_key] = (validators, response_json)
+        return response_json, True
+
     def call_api(self):
         """Override this in your child class. It should return a dict of
-        cleaned data from the API.
+        cleaned data from the API, and set `call_failed` if it couldn't get
+        any.
         """
         pass
 
 
+class APIClientLoop(object):
+    """
+    Runs API clients as tasks on one thread in the renderer's process, which
+    saves a process for each of them. Each client is run when its update is
+    due, or when a message for it arrives on its pipe. The clients should
+    publish to `LocalStateChannel`s, since there's no other process to share
+    memory with.
+    """
+    def __init__(self, clients):
+        self.clients = clients
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run_forever,
+                                       name='api_clients')
+        # Don't keep the clock running just for the API calls
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run_forever(self):
+        for client in self.clients:
+            try:
+                client.load_cache()
+            except Exception:
+                logger.exception('Exception while loading the cache for '
+                                 '{}'.format(client))
+        pipes = [client.mp_pipe for client in self.clients]
+        while True:
+            for client in self.clients:
+                try:
+                    client.run()
+                except Exception:
+                    # Keep the other clients going, and try this one again
+                    # when its next update is due
+                    logger.exception('Exception while running {}'.format(
+                                     client))
+            timeouts = [client.seconds_until_next_update()
+                        for client in self.clients]
+            timeouts = [timeout for timeout in timeouts if timeout is not None]
+            select.select(pipes, [], [], min(timeouts) if timeouts else None)
+
+
 class WeatherAPIClient(APIClient):
-    def __init__(self, mp_pipe):
-        super(WeatherAPIClient, self).__init__(mp_pipe)
+    FIELDS = (
+        ('error', bool),
+        ('current_temp', int),
+        ('forecast', WeatherType),
+        ('sunrise', datetime),
+        ('sunset', datetime),
+    )
+
+    def __init__(self, channel):
+        super(WeatherAPIClient, self).__init__(channel)
         self.cache_minutes = 10
+        self.sun_times = None
+        if LATITUDE is not None and LONGITUDE is not None:
+            self.sun_times = SunTimesTable(LATITUDE, LONGITUDE)
+        # Sessions aren't thread safe, and the astro API is called on a
+        # thread of its own
+        self.astro_session = requests.Session()
+
+    def clean_weather(self, weather_json):
+        weather = {}
+        # List of hourly weather forecast. Index is number of hours
+        # into the future from now (0 = now, 1 = next hour, etc.)
+        hourly_weather = weather_json['properties']['periods']
+        weather['current_temp'] = int(hourly_weather[0]['temperature'])
+        logger.info("Got current temp {}".format(weather['current_temp']))
+        weather['forecast'] = None
+        for hour_weather in hourly_weather[0:WEATHER_FORECAST_HOURS+1]:
+            # Find the most severe weather in this interval. Use the
+            # icon to determine the weather, because that's the most
+            # pared down. https://api.weather.gov/icons
+            forecast_icon_url = hour_weather['icon']
+            icon_path = urlparse(forecast_icon_url).path
+            # Sometimes, the icon path will have a comma and a number after
+            # like: /icons/land/night/rain_showers,20
+            icon_re = re.compile('/[A-Za-z_]+')
+            re_matches = icon_re.findall(icon_path)
+            if re_matches:
+                # Icon name will be the last match. Also, strip off the
+                # leading slash from the regex match
+                icon_name = re_matches[-1][1:]
+                matched_forecast = W_GOV_ICON_2_WEATHER[icon_name]
+                if weather.get('forecast'):
+                    # Replace the forecast with the more severe weather
+                    weather['forecast'] = max(weather['forecast'],
+                                              matched_forecast)
+                else:
+                    # First valid forecast
+                    weather['forecast'] = matched_forecast
+        logger.info("Got forecast {}".format(weather['forecast']))
+        return weather
 
     def call_api(self):
         weather = {}
         weather['error'] = False
+        cross_check = None
+        if self.sun_times is None:
+            # Without a location, sunrise and sunset come from the astro
+            # API, or the default hours if it can't be reached
+            weather['sunrise'], weather['sunset'] = self.get_astro_sun_times(
+                self.session)
+        else:
+            # Sunrise and sunset are calculated locally, and only checked
+            # against the astro API if asked to
+            now = datetime.now()
+            weather['sunrise'], weather['sunset'] = self.sun_times.get(
+                now.date())
+            logger.info("Calculated sunrise {} and sunset {}".format(
+                        weather['sunrise'], weather['sunset']))
+        if self.sun_times is not None and SUN_TIMES_CROSS_CHECK:
+            # Call the astro API while waiting on the weather API
+            cross_check = threading.Thread(
+                target=self.cross_check_sun_times,
+                args=(weather['sunrise'], weather['sunset']))
+            cross_check.start()
         try:
-            weather_json = requests.get(W_GOV_WEATHER_URL).json()
-            # List of hourly weather forecast. Index is number of hours
-            # into the future from now (0 = now, 1 = next hour, etc.)
-            hourly_weather = weather_json['properties']['periods']
-            weather['current_temp'] = int(hourly_weather[0]['temperature'])
-            logger.info("Got current temp {}".format(weather['current_temp']))
-            weather['forecast'] = None
-            for hour_weather in hourly_weather[0:WEATHER_FORECAST_HOURS+1]:
-                # Find the most severe weather in this interval. Use the
-                # icon to determine the weather, because that's the most
-                # pared down. https://api.weather.gov/icons
-                forecast_icon_url = hour_weather['icon']
-                icon_path = urlparse(forecast_icon_url).path
-                # Sometimes, the icon path will have a comma and a number after
-                # like: /icons/land/night/rain_showers,20
-                icon_re = re.compile('/[A-Za-z_]+')
-                re_matches = icon_re.findall(icon_path)
-                if re_matches:
-                    # Icon name will be the last match. Also, strip off the
-                    # leading slash from the regex match
-                    icon_name = re_matches[-1][1:]
-                    matched_forecast = W_GOV_ICON_2_WEATHER[icon_name]
-                    if weather.get('forecast'):
-                        # Replace the forecast with the more severe weather
-                        weather['forecast'] = max(weather['forecast'],
-                                                  matched_forecast)
-                    else:
-                        # First valid forecast
-                        weather['forecast'] = matched_forecast
-            logger.info("Got forecast {}".format(weather['forecast']))
+            weather_json, is_modified = self.get_json(W_GOV_WEATHER_URL)
+            if is_modified:
+                weather.update(self.clean_weather(weather_json))
+            else:
+                logger.info("Weather hasn't changed since the last call")
         except Exception:
             logger.exception('Exception during weather API call.')
             weather['error'] = True
+            self.call_failed = True
+        if cross_check is not None:
+            cross_check.join()
+        return weather
+
+    def get_astro_sun_times(self, session):
+        """Returns today's (sunrise, sunset) from the astro API, called over
+        `session`, or (None, None) if it couldn't be reached.
+        """
         try:
             astro_args = {'formatted': 0}  # Get a full date/time string
-            astro_json = requests.get(ASTRO_API_URL, params=astro_args).json()
+            astro_json, _ = self.get_json(ASTRO_API_URL, params=astro_args,
+                                          session=session)
             sunrise_str = astro_json['results']['sunrise']
             sunset_str = astro_json['results']['sunset']
             local_tz = tz.tzlocal()
@@ -121,26 +341,41 @@ class WeatherAPIClient(APIClient):
             # next day, so convert it to the current day
             now = datetime.now()
             sunrise_utc = dateutil_parse(sunrise_str).astimezone(local_tz)
-            sunrise = datetime.combine(date=now.date(),
-                                       time=sunrise_utc.time())
+            api_sunrise = datetime.combine(date=now.date(),
+                                           time=sunrise_utc.time())
             sunset_utc = dateutil_parse(sunset_str).astimezone(local_tz)
-            sunset = datetime.combine(date=now.date(),
-                                      time=sunset_utc.time())
-            weather['sunrise'] = sunrise
-            weather['sunset'] = sunset
-            logger.info("Got sunrise {} and sunset {}".format(
-                        weather['sunrise'], weather['sunset']))
+            api_sunset = datetime.combine(date=now.date(),
+                                          time=sunset_utc.time())
+            logger.info("Astro API has sunrise {} and sunset {}".format(
+                        api_sunrise, api_sunset))
+            return api_sunrise, api_sunset
         except Exception:
             logger.exception('Exception during astro API call.')
-            weather['error'] = True
-        return weather
+            return None, None
+
+    def cross_check_sun_times(self, sunrise, sunset):
+        """Logs how far the calculated sunrise and sunset are from the astro
+        API's.
+        """
+        api_sunrise, api_sunset = self.get_astro_sun_times(self.astro_session)
+        if sunrise and sunset and api_sunrise and api_sunset:
+            logger.info(
+                "Calculated sunrise and sunset are off by {:.0f} and "
+                "{:.0f} seconds".format(
+                    (sunrise - api_sunrise).total_seconds(),
+                    (sunset - api_sunset).total_seconds()))
 
 
 class TrafficAPIClient(APIClient):
-    def __init__(self, mp_pipe):
+    FIELDS = (
+        ('traffic_delta', int),
+        ('travel_time', int),
+    )
+
+    def __init__(self, channel):
         # Google maps standard API allows 2500 requests/day, which is just over
         # two per minute
-        super(TrafficAPIClient, self).__init__(mp_pipe)
+        super(TrafficAPIClient, self).__init__(channel)
         self.cache_minutes = 5
 
     def call_api(self):
@@ -157,6 +392,7 @@ class TrafficAPIClient(APIClient):
         except Exception:
             logger.exception('Exception during traffic API call')
             traffic = {}
+            self.call_failed = True
         if directions:
             # Only one destination, so just extract the first leg
             directions = directions[0]['legs'][0]
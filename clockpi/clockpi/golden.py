@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from clockpi.benchmark import BENCHMARK_SEED
+from clockpi.benchmark import BENCHMARK_TIMESTAMP
+from clockpi.benchmark import FixedClockInfoUpdater
+from clockpi.clockface_config import WEATHER_ANIMATIONS
+from clockpi.constants import DEFAULT_SUNRISE_HOUR
+from clockpi.constants import DEFAULT_SUNSET_HOUR
+from clockpi.graphics.graphics import LEDPi
+from clockpi.update_clock_info import DAILY_COLOR_TABLE
+
+
+# Reference hashes of every golden frame, by scenario name and frame number
+GOLDEN_FRAMES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'golden_frames.json')
+FRAMES_PER_SCENARIO = 3  # Consecutive seconds, so animations move
+# Seconds after the first frame of frames that are also checked for weather
+# with motion, which lands between pixels in between seconds
+SUBSECOND_FRAMES = (0.25, 0.5)
+# Seconds that procedural animations run for before the first frame, so the
+# rain has fallen past the clouds
+ANIMATION_WARM_UP = 40
+TIMES_OF_DAY = (('day', 12 * 60), ('night', 23 * 60))  # Minute of the day
+TEMPERATURES = (('temp', [7, 2]), ('error', ['E', 'R']), ('skull', ['SKULL']))
+HOURS = (('two_digit_hour', [1, 2]), ('blank_hour', ['BLANK', 9]))
+
+
+def golden_scenarios():
+    """
+    Returns a list of (name, clock info) covering every forecast key, day and
+    night colors, traffic on and off, error and out of range temperatures and
+    a blank first hour digit.
+    """
+    forecast_keys = [None] + sorted(WEATHER_ANIMATIONS)
+    scenarios = []
+    for forecast_key, (time_name, minute), show_traffic, \
+            (temp_name, temp_digits), (hour_name, hour_digits) in \
+            itertools.product(forecast_keys, TIMES_OF_DAY, (False, True),
+                              TEMPERATURES, HOURS):
+        brightness, color = DAILY_COLOR_TABLE.get(
+            DEFAULT_SUNRISE_HOUR, DEFAULT_SUNSET_HOUR, minute)
+        name = '/'.join((forecast_key or 'no_forecast', time_name,
+                         'traffic' if show_traffic else 'no_traffic',
+                         temp_name, hour_name))
+        scenarios.append((name, {
+            'forecast_key': forecast_key,
+            'brightness': brightness,
+            'color': list(color),
+            'show_traffic': show_traffic,
+            'traffic': {'traffic_delta': 3, 'travel_time': 27},
+            'traffic_delta_digits': [0, 3],
+            'travel_time_digits': [2, 7],
+            'temp_digits': temp_digits,
+            'hour_digits': hour_digits,
+            'minute_digits': [4, 5],
+            'second_digits': [5, 9],
+        }))
+    return scenarios
+
+
+def render_golden_frames(scenarios):
+    """
+    Renders `FRAMES_PER_SCENARIO` frames of each scenario, starting from the
+    same state every time, then the `SUBSECOND_FRAMES` if its weather moves.
+    Returns a dict of frame name -> matrix.
+    """
+    frames = {}
+    ledpi = LEDPi(clock_info_updater=FixedClockInfoUpdater({}))
+    for name, data in scenarios:
+        ledpi.clock_info_updater.fixed_data = data
+        np.random.seed(BENCHMARK_SEED)
+        for plan in ledpi.weather_animations.itervalues():
+            for anim_obj in plan.procedural_animations:
+                anim_obj.reset()
+                for second in xrange(-ANIMATION_WARM_UP, 0):
+                    anim_obj.get_next_frame(BENCHMARK_TIMESTAMP + second)
+        for frame_number in xrange(FRAMES_PER_SCENARIO):
+            frames['{}/{}'.format(name, frame_number)] = ledpi.display_clock(
+                current_time=BENCHMARK_TIMESTAMP + frame_number)
+        forecast_key = data['forecast_key']
+        if forecast_key is None or \
+                ledpi.weather_animations[forecast_key].fps == 1:
+            continue
+        for offset in SUBSECOND_FRAMES:
+            frames['{}/{}'.format(name, offset)] = ledpi.display_clock(
+                current_time=BENCHMARK_TIMESTAMP + offset)
+    return frames
+
+
+def frame_hash(matrix):
+    return hashlib.md5(matrix.tobytes()).hexdigest()
+
+
+def save_failure(matrix, name, failure_dir, scale=8):
+    """Saves `matrix` as a PNG scaled up `scale` times. Returns its path."""
+    if not os.path.isdir(failure_dir):
+        os.makedirs(failure_dir)
+    image = Image.fromarray(matrix.swapaxes(0, 1).copy(), 'RGB')
+    image = image.resize((image.width * scale, image.height * scale),
+                         Image.NEAREST)
+    path = os.path.join(failure_dir, name.replace('/', '-') + '.png')
+    image.save(path)
+    return path
+
+
+def check_golden_frames(frames, golden_hashes, failure_dir):
+    """
+    Compares `frames` with the reference hashes, saving the frames that
+    don't match to `failure_dir`. Returns the names of those frames.
+    """
+    failures = []
+    for name in sorted(frames):
+        if golden_hashes.get(name) != frame_hash(frames[name]):
+            failures.append(name)
+            save_failure(frames[name], name, failure_dir)
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Checks that rendered frames match the reference hashes')
+    parser.add_argument('--update', action='store_true',
+                        help='Save the current frames as the reference')
+    parser.add_argument('--golden-frames', default=GOLDEN_FRAMES_PATH)
+    parser.add_argument('--failure-dir',
+                        default=os.path.join(tempfile.gettempdir(),
+                                             'clockpi_golden_failures'),
+                        help='Where frames that do not match are saved')
+    args = parser.parse_args()
+
+    start_time = time.time()
+    frames = render_golden_frames(golden_scenarios())
+    if args.update:
+        with open(args.golden_frames, 'w') as golden_file:
+            json.dump(dict((name, frame_hash(matrix))
+                           for name, matrix in frames.iteritems()),
+                      golden_file, indent=0, separators=(',', ': '),
+                      sort_keys=True)
+        print('Saved {} golden frames to {}'.format(len(frames),
+                                                    args.golden_frames))
+        sys.exit(0)
+    with open(args.golden_frames) as golden_file:
+        golden_hashes = json.load(golden_file)
+    failures = check_golden_frames(frames, golden_hashes, args.failure_dir)
+    missing = set(golden_hashes) - set(frames)
+    print('Checked {} frames in {:.1f} seconds'.format(
+          len(frames), time.time() - start_time))
+    for name in failures:
+        print('Mismatch: {}'.format(name))
+    for name in sorted(missing):
+        print('Not rendered: {}'.format(name))
+    if failures:
+        print('Frames that did not match were saved to {}'.format(
+              args.failure_dir))
+    sys.exit(1 if failures or missing else 0)
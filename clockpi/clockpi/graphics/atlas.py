@@ -0,0 +1,73 @@
+import numpy as np
+
+from clockpi.alphanum import glyphs
+from clockpi.alphanum import letters_tiny
+from clockpi.alphanum import numbers_large
+from clockpi.alphanum import numbers_small
+from clockpi.alphanum import numbers_tiny
+from clockpi.alphanum import weather_animations
+from clockpi.constants import GLYPH_TINT_CACHE_SIZE
+from clockpi.graphics.color_utils import set_brightness
+from clockpi.graphics.lru_cache import LRUCache
+from clockpi.graphics.mask import get_halo
+
+
+class Glyph(object):
+    """A hand-drawn alphanum packed into a boolean array"""
+    def __init__(self, bitmap):
+        # The hand-drawn artwork is indexed [y][x], so transpose it to match
+        # the matrix, which is indexed [x][y]
+        self.is_on = np.asarray(bitmap, dtype=bool).T.copy()
+        self.width, self.height = self.is_on.shape
+        # Static, so the mask's halo only needs to be worked out once
+        self.halo = get_halo(self.is_on)
+
+
+class GlyphAtlas(object):
+    """
+    Holds every glyph from the given alphanum modules, packed once up front,
+    along with a bounded cache of colored versions of them so they can be
+    copied straight into a matrix.
+    """
+    def __init__(self, modules, cache_size=GLYPH_TINT_CACHE_SIZE):
+        self.glyphs = {}  # id of the hand-drawn list -> (list, Glyph)
+        self.tinted_glyphs = LRUCache(cache_size)
+        for module in modules:
+            for bitmap in vars(module).itervalues():
+                is_bitmap = (isinstance(bitmap, list) and bitmap and
+                             isinstance(bitmap[0], list))
+                if is_bitmap:
+                    self.add(bitmap)
+
+    def add(self, bitmap):
+        # Keep a reference to the list so that its id can't be reused
+        self.glyphs[id(bitmap)] = (bitmap, Glyph(bitmap))
+
+    def get(self, bitmap):
+        """Returns the Glyph for `bitmap`, or None if it isn't in the atlas"""
+        entry = self.glyphs.get(id(bitmap))
+        if entry is None:
+            return None
+        return entry[1]
+
+    def tinted(self, glyph, color=None, brightness=None):
+        """
+        Returns a (width, height, 3) array of `glyph` drawn in `color` at
+        `brightness`, the same as `add_to_matrix` would draw it on an empty
+        matrix.
+        """
+        color = color or [255, 255, 255]
+        key = (id(glyph), tuple(color), brightness)
+        tinted_glyph = self.tinted_glyphs.get(key)
+        if tinted_glyph is None:
+            if brightness:
+                color = set_brightness(color, brightness)
+            tinted_glyph = np.zeros((glyph.width, glyph.height, 3),
+                                    dtype=np.uint8)
+            tinted_glyph[glyph.is_on] = color
+            self.tinted_glyphs.put(key, tinted_glyph)
+        return tinted_glyph
+
+
+GLYPH_ATLAS = GlyphAtlas((glyphs, letters_tiny, numbers_large, numbers_small,
+                          numbers_tiny, weather_animations))
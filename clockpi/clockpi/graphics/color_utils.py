@@ -1,6 +1,14 @@
 import math
 
+import numpy as np
+
+from clockpi.constants import BRIGHTNESS_LUT_CACHE_SIZE
 from clockpi.constants import GLOBAL_BRIGHTNESS_MIN
+from clockpi.graphics.lru_cache import LRUCache
+
+
+# Lookup tables for `set_brightness_array`, see `get_brightness_lut`
+BRIGHTNESS_LUTS = LRUCache(BRIGHTNESS_LUT_CACHE_SIZE)
 
 
 def set_brightness(color, brightness, as_percentage=False, allow_zero=False):
@@ -33,6 +41,63 @@ def set_brightness(color, brightness, as_percentage=False, allow_zero=False):
     return map(int, result_color)
 
 
+def get_brightness_lut(brightness, as_percentage=False):
+    """
+    Returns a lookup table with the results of `set_brightness` for each color
+    component before the minimum brightness is enforced. If `as_percentage`,
+    the table is indexed by [color component], otherwise it's indexed by
+    [sum of the color's components, color component], since the components
+    are scaled relative to the color's average.
+    """
+    key = (brightness, as_percentage)
+    lut = BRIGHTNESS_LUTS.get(key)
+    if lut is None:
+        components = np.arange(256, dtype=np.float64)
+        if as_percentage:
+            average = 1.0
+        else:
+            components = components[np.newaxis, :]
+            # Sums of zero are off colors, so don't divide by zero for them
+            average = np.arange(256 * 3, dtype=np.float64)[:, np.newaxis] / 3
+            average[0] = 1.0
+        lut = np.clip(components / average * brightness, 0, 255)
+        if not as_percentage:
+            lut[0] = 0
+        lut = lut.astype(np.uint8)
+        BRIGHTNESS_LUTS.put(key, lut)
+    return lut
+
+
+def set_brightness_array(colors, brightness, as_percentage=False,
+                         allow_zero=False):
+    """
+    Same as `set_brightness`, but works on an int array of colors, where the
+    last axis is r, g, b, using a lookup table for `brightness`. Returns a
+    uint8 array of the same shape.
+    """
+    if not as_percentage and (brightness < 0 or brightness > 255):
+        raise ValueError('Brightness {} is invalid.'.format(brightness))
+    colors = np.asarray(colors)
+    if brightness == 0:
+        return np.zeros(colors.shape, dtype=np.uint8)
+    lut = get_brightness_lut(brightness, as_percentage)
+    if as_percentage:
+        result_colors = lut[colors]
+    else:
+        result_colors = lut[colors.sum(axis=-1, keepdims=True), colors]
+    if not allow_zero:
+        # The scaling keeps the order of the components, so the dominant
+        # components are the same before and after scaling
+        max_components = colors.max(axis=-1, keepdims=True)
+        too_dim = ((result_colors.max(axis=-1, keepdims=True) <
+                    GLOBAL_BRIGHTNESS_MIN) & (max_components > 0))
+        dominant_colors = np.where(colors == max_components,
+                                   GLOBAL_BRIGHTNESS_MIN, 0)
+        result_colors = np.where(too_dim, dominant_colors,
+                                 result_colors).astype(np.uint8)
+    return result_colors
+
+
 def calc_color_cos(current_time, start, end, min_val, max_val):
     """
     Calculates an upside down cosine that is offset and has some period, but
@@ -1,41 +1,128 @@
+from clockpi.clock import SYSTEM_CLOCK
+from clockpi.clockface_config import BACKGROUNDS
 from clockpi.clockface_config import PLAIN_CLOCKFACE
 from clockpi.clockface_config import TRAFFIC_CLOCKFACE
 from clockpi.clockface_config import WEATHER_ANIMATIONS
+from clockpi.constants import BACKGROUND_BRIGHTNESS
+from clockpi.constants import CLOCKFACE_BACKGROUND
+from clockpi.graphics.atlas import GLYPH_ATLAS
+from clockpi.graphics.color_utils import BRIGHTNESS_LUTS
+from clockpi.graphics.render_plan import LAYER_CACHE
+from clockpi.graphics.render_plan import RenderPlan
 from clockpi.graphics.utils import add_to_matrix
-from clockpi.graphics.utils import config_to_matrix
 from clockpi.graphics.utils import generate_empty_matrix
+from clockpi.metrics import FrameMetrics
+from clockpi.scheduler import next_second_boundary
 from clockpi.update_clock_info import ClockInfoUpdater
 
 
 class LEDPi(object):
-    def __init__(self, update_freq=0.0):
+    def __init__(self, update_freq=0.0, clock_info_updater=None,
+                 metrics=None, clock=SYSTEM_CLOCK,
+                 background=CLOCKFACE_BACKGROUND):
         self.update_freq = update_freq
+        self.clock = clock
         self.data = {}
-        self.clock_info_updater = ClockInfoUpdater()
+        if metrics is None:
+            metrics = FrameMetrics()
+        self.metrics = metrics
+        self.metrics.watch_cache('layers', LAYER_CACHE)
+        self.metrics.watch_cache('tinted_glyphs', GLYPH_ATLAS.tinted_glyphs)
+        self.metrics.watch_cache('brightness_luts', BRIGHTNESS_LUTS)
+        if clock_info_updater is None:
+            clock_info_updater = ClockInfoUpdater(clock)
+        self.clock_info_updater = clock_info_updater
+        self.plain_clockface = RenderPlan(PLAIN_CLOCKFACE)
+        self.traffic_clockface = RenderPlan(TRAFFIC_CLOCKFACE)
+        self.weather_animations = dict(
+            (forecast_key, RenderPlan(weather_config))
+            for forecast_key, weather_config in WEATHER_ANIMATIONS.iteritems())
+        self.last_frame_time = None
+        self.background = None
+        if background is not None:
+            if background not in BACKGROUNDS:
+                raise ValueError("Unknown background {}".format(background))
+            self.background = RenderPlan(BACKGROUNDS[background])
 
-    def display_clock(self):
+    def display_clock(self, current_time=None):
         """
         Returns the current matrix to be displayed, or None, if the display
-        shouldn't be updated right now.
+        shouldn't be updated right now. Animations are drawn as they are at
+        `current_time` (the clock's time by default).
         """
-        if not self.clock_info_updater.run(self.data, self.update_freq):
+        if current_time is None:
+            current_time = self.clock.time()
+        with self.metrics.timer('update'):
+            updated = self.clock_info_updater.run(self.data, self.update_freq)
+        if not updated:
             return None
-        matrix = generate_empty_matrix()
+        with self.metrics.timer('compose'):
+            matrix = self.compose(current_time)
+        self.count_dropped_frames(current_time)
+        return matrix
+
+    def count_dropped_frames(self, current_time):
+        """
+        Records the time since the last frame, and counts the frames that were
+        due in between as dropped. Frames are drawn as they are at the time
+        they're drawn, so falling behind skips frames instead of slowing the
+        animations down.
+        """
+        frame_rate = max([1] + [plan.frame_rate
+                                for plan in self.active_plans()])
+        if self.last_frame_time is not None:
+            elapsed = current_time - self.last_frame_time
+            self.metrics.record('frame_interval', elapsed)
+            dropped = int(round(elapsed * frame_rate)) - 1
+            if dropped > 0:
+                self.metrics.count('frames_dropped', dropped)
+        self.last_frame_time = current_time
+
+    def compose(self, current_time=None):
+        """Draws the clock from the clock info that's already in `data`"""
+        if self.background is not None:
+            brightness = max(1, int(round(
+                self.data['brightness'] * BACKGROUND_BRIGHTNESS)))
+            matrix = self.background.run(self.data, brightness=brightness,
+                                         current_time=current_time)
+        else:
+            matrix = generate_empty_matrix()
         forecast_key = self.data.get('forecast_key')
         if forecast_key:
-            weather_config = WEATHER_ANIMATIONS[forecast_key]
-            for conf in weather_config.itervalues():
-                conf.setdefault('color', self.data['color'])
-            weather_matrix = config_to_matrix(
-                weather_config, self.data,
-                brightness=self.data['brightness'], bit_or=False)
+            # Weather without its own color is drawn in the clock's color
+            weather_matrix = self.weather_animations[forecast_key].run(
+                self.data, brightness=self.data['brightness'],
+                default_color=self.data['color'], current_time=current_time,
+                bit_or=False)
             add_to_matrix(weather_matrix, matrix, 0, 0, transpose=False)
         if self.data['show_traffic'] and self.data.get('traffic'):
-            clockface = config_to_matrix(TRAFFIC_CLOCKFACE, self.data,
-                                         color=self.data['color'])
+            clockface = self.traffic_clockface.run(
+                self.data, color=self.data['color'], current_time=current_time)
         else:
-            clockface = config_to_matrix(PLAIN_CLOCKFACE, self.data,
-                                         color=self.data['color'])
+            clockface = self.plain_clockface.run(
+                self.data, color=self.data['color'], current_time=current_time)
         add_to_matrix(clockface, matrix, 0, 0, transpose=False,
                       bit_or=False, mask=True)
         return matrix
+
+    def active_plans(self):
+        """Returns the animated plans that are being drawn"""
+        plans = []
+        forecast_key = self.data.get('forecast_key')
+        if forecast_key:
+            plans.append(self.weather_animations[forecast_key])
+        if self.background is not None:
+            plans.append(self.background)
+        return plans
+
+    def next_frame_time(self, current_time=None):
+        """
+        Returns the time at which the displayed clock could next change: the
+        next second, or the next frame of an animation if it comes sooner.
+        """
+        if current_time is None:
+            current_time = self.clock.time()
+        next_time = next_second_boundary(current_time)
+        for plan in self.active_plans():
+            next_time = min(next_time, plan.next_frame_time(current_time))
+        return next_time
@@ -0,0 +1,33 @@
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    A cache that drops the least recently used item once it holds `max_size`
+    items. Keeps count of hits and misses so the savings can be checked.
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()  # Least recently used first
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Returns the cached value for `key`, or None on a miss"""
+        value = self.items.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.items[key] = value
+        return value
+
+    def put(self, key, value):
+        self.items.pop(key, None)
+        if len(self.items) >= self.max_size:
+            self.items.popitem(last=False)
+        self.items[key] = value
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self.items)}
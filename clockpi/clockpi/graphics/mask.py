@@ -0,0 +1,19 @@
+import numpy as np
+
+
+def get_halo(is_on):
+    """
+    Returns the pixels that are adjacent to ON pixels (including diagonals),
+    but aren't ON themselves. This is a binary dilation of `is_on` with a 3x3
+    square, minus `is_on`. The halo can extend one pixel past `is_on`, so the
+    result has a border of one pixel all the way around it.
+    """
+    padded_on = np.pad(is_on, 1, 'constant')
+    # The square is separable, so dilate along x and then along y
+    dilated_x = padded_on.copy()
+    dilated_x[1:] |= padded_on[:-1]
+    dilated_x[:-1] |= padded_on[1:]
+    dilated = dilated_x.copy()
+    dilated[:, 1:] |= dilated_x[:, :-1]
+    dilated[:, :-1] |= dilated_x[:, 1:]
+    return dilated & ~padded_on
@@ -0,0 +1,335 @@
+import fractions
+import math
+import time
+from types import ModuleType
+
+import numpy as np
+
+from clockpi.constants import ANIMATION_FPS
+from clockpi.constants import LAYER_CACHE_SIZE
+from clockpi.constants import SUBPIXEL_STEPS
+from clockpi.graphics.color_utils import set_brightness
+from clockpi.graphics.lru_cache import LRUCache
+from clockpi.graphics.mask import get_halo
+from clockpi.graphics.utils import add_items_to_matrix
+from clockpi.graphics.utils import add_to_matrix
+from clockpi.graphics.utils import generate_empty_matrix
+from clockpi.graphics.utils import layout_items
+from clockpi.graphics.utils import shift_subpixel
+
+
+# Rendered clockface groups, see `RenderPlan.run`
+LAYER_CACHE = LRUCache(LAYER_CACHE_SIZE)
+# Configs that have been through `config_to_matrix`, by id
+RENDER_PLANS = {}
+
+
+def _hashable(lookup_data):
+    if isinstance(lookup_data, list):
+        return tuple(lookup_data)
+    return lookup_data
+
+
+def _lcm(a, b):
+    return a * b // fractions.gcd(a, b)
+
+
+def _font_lookup(font, group_name):
+    """
+    Makes a dict for looking up alphanums in `font` by index or by name, the
+    same way that `data_to_alphanums` does.
+    """
+    if isinstance(font, ModuleType):
+        lookup = dict(enumerate(getattr(font, 'ALL_NUMBERS', ())))
+        for name, alphanum in vars(font).iteritems():
+            if isinstance(alphanum, list):
+                lookup[name] = alphanum
+        return lookup
+    if type(font) in (tuple, list):
+        return dict(enumerate(font))
+    raise ValueError("The font for {} must be a module or a list of "
+                     "alphanums".format(group_name))
+
+
+def _render_layer(items, positions, mask=False):
+    """
+    Draws `items` at `positions` on an empty matrix. Returns which pixels of
+    the part of the matrix that has ON pixels are ON, along with its position
+    and its mask's halo (if it has a mask), as (layer, x, y, halo), or
+    (None, 0, 0, None) if nothing was drawn. The layer has no color, so it
+    can be drawn in any.
+    """
+    matrix = generate_empty_matrix()
+    for item, (x, y) in zip(items, positions):
+        add_to_matrix(item, matrix, x, y)
+    is_on = matrix.any(axis=2)
+    on_xs = np.flatnonzero(is_on.any(axis=1))
+    on_ys = np.flatnonzero(is_on.any(axis=0))
+    if not len(on_xs):
+        return None, 0, 0, None
+    x_start, x_end = on_xs[0], on_xs[-1] + 1
+    y_start, y_end = on_ys[0], on_ys[-1] + 1
+    layer = is_on[x_start:x_end, y_start:y_end].copy()
+    halo = None
+    if mask:
+        halo = get_halo(is_on[x_start:x_end, y_start:y_end])
+    return layer, int(x_start), int(y_start), halo
+
+
+class _GroupStep(object):
+    """One group of a clockface config, with its fonts and layout resolved"""
+    def __init__(self, group_name, group_config):
+        self.group_name = group_name
+        self.color = group_config.get('color')
+        self.mask = group_config.get('mask', False)
+        if 'spatial' not in group_config:
+            raise ValueError("{} has no spatial info".format(group_name))
+        self.spatial = dict(group_config['spatial'])
+        # Fails the same way drawing would if the position is incomplete
+        layout_items([], **self.spatial)
+        self.procedural_animation = group_config.get('procedural_animation')
+        self.data_key = None
+        self.fonts = []
+        if 'item' in group_config:
+            self.frames = [self.layout([group_config['item'], ])]
+        elif self.procedural_animation:
+            self.frames = None
+        elif 'animation' in group_name:
+            if 'font' not in group_config:
+                raise ValueError("Animation {} has no font".format(
+                                 group_name))
+            self.frames = [self.layout([frame, ])
+                           for frame in group_config['font']]
+        else:
+            self.frames = None
+            if 'data_key' not in group_config:
+                raise ValueError("{} has no data_key".format(group_name))
+            self.data_key = group_config['data_key']
+            if 'font_choices' in group_config:
+                fonts = group_config['font_choices']
+            elif 'font' in group_config:
+                fonts = [group_config['font'], ]
+            else:
+                raise ValueError("{} has no font".format(group_name))
+            self.fonts = [_font_lookup(font, group_name) for font in fonts]
+        # A tween moves the group around, `fps` times a second
+        self.motion = group_config.get('motion')
+        self.fps = 1
+        if self.motion is not None:
+            if self.frames is None:
+                raise ValueError("Only items and animations can have motion, "
+                                 "not {}".format(group_name))
+            self.fps = group_config.get('fps', ANIMATION_FPS)
+            if int(self.fps) != self.fps or self.fps < 1:
+                raise ValueError("The fps of {} must be a whole number".format(
+                                 group_name))
+
+    def layout(self, items):
+        """Returns `items` along with the top left corner of each of them"""
+        item_sizes = [(len(item[0]), len(item)) for item in items]
+        return items, layout_items(item_sizes, **self.spatial)
+
+    def lookup(self, lookup_data):
+        """
+        Looks up the alphanums for `lookup_data` in the first font that has
+        all of them, and returns them laid out like `layout` does.
+        """
+        if type(lookup_data) not in (list, tuple):
+            lookup_data = [lookup_data]
+        for font in self.fonts:
+            try:
+                items = [font[item] for item in lookup_data]
+            except (KeyError, TypeError):
+                continue
+            return self.layout(items)
+        raise ValueError("None of the font choices for {} worked.".format(
+                         self.group_name))
+
+
+class RenderPlan(object):
+    """
+    A clockface configuration (see `clockpi.clockface_config`) compiled into a
+    flat list of groups to draw, so the configuration only has to be checked,
+    and its fonts and item positions worked out, once. A configuration that
+    could never be drawn raises a ValueError here instead of on every frame.
+
+    If a group has 'font_choices' the first font that has all of the looked up
+    data will be used. A group can also have a matrix under the key 'item', in
+    case you just want to add a static image.
+
+    A group with 'motion' (a `clockpi.graphics.tween.Tween`) is moved by it,
+    'fps' times a second, and can land between pixels. The plan's frames come
+    `fps` times a second, often enough for all of its groups.
+
+    A configuration that doesn't look anything up in the data and has no
+    procedural animations, like most of the weather, looks the same every
+    `phases` frames. Each of those frames is baked into a matrix the first
+    time it's drawn, so no frame costs more than drawing it would, and the
+    baked frames are thrown away when the colors, brightness or blend change.
+    """
+    def __init__(self, config):
+        self.steps = [_GroupStep(group_name, group_config)
+                      for group_name, group_config in config.iteritems()]
+        self.procedural_animations = [step.procedural_animation
+                                      for step in self.steps
+                                      if step.procedural_animation]
+        self.can_bake = all(step.frames is not None for step in self.steps)
+        self.fps = 1
+        period = 1  # Seconds until animations all start over together
+        for step in self.steps:
+            if step.frames is not None:
+                period = _lcm(period, len(step.frames))
+            if step.motion is not None:
+                period = _lcm(period, step.motion.period)
+                self.fps = _lcm(self.fps, step.fps)
+        self.phases = period * self.fps
+        # How often the plan can change, procedural animations included
+        self.frame_rate = max([self.fps] + [
+            anim_obj.ANIMATION_FREQ
+            for anim_obj in self.procedural_animations])
+        self.bake_key = None
+        self.baked_frames = []
+
+    def run(self, data, color=None, brightness=None, default_color=None,
+            current_time=None, **kwargs):
+        """
+        Generates a matrix from `data`. `color` overrides the color of every
+        group, and `default_color` is used for groups without a color.
+        Animations are drawn as they are at `current_time` (now by default).
+        """
+        if current_time is None:
+            current_time = time.time()
+        frame_number = int(math.floor(current_time * self.fps))
+        if not self.can_bake:
+            return self.compose(data, frame_number, current_time, color,
+                                brightness, default_color, **kwargs)
+        bake_key = (_hashable(color), brightness, _hashable(default_color),
+                    tuple(sorted(kwargs.items())))
+        if bake_key != self.bake_key:
+            self.baked_frames = [None] * self.phases
+            self.bake_key = bake_key
+        phase = frame_number % self.phases
+        if self.baked_frames[phase] is None:
+            self.baked_frames[phase] = self.compose(
+                data, phase, current_time, color, brightness, default_color,
+                **kwargs)
+        return self.baked_frames[phase].copy()
+
+    def next_frame_time(self, current_time):
+        """Returns the time of the plan's next frame after `current_time`"""
+        next_time = (math.floor(current_time * self.fps) + 1) / self.fps
+        for anim_obj in self.procedural_animations:
+            next_time = min(next_time, anim_obj.next_frame_time())
+        return next_time
+
+    def compose(self, data, frame_number, current_time, color=None,
+                brightness=None, default_color=None, **kwargs):
+        """
+        Draws the matrix for `frame_number` (counted `fps` times a second) of
+        the animations, and for `current_time` for procedural animations.
+
+        Each group is drawn on its own layer, which is cached based on the
+        data it shows, so only groups whose data changed get redrawn. The
+        layers are then added to the matrix in order in the group's color,
+        with its mask, `brightness` and the blend given in `kwargs`. Color
+        and brightness are applied to the blended pixels, like they are when
+        drawing items straight onto the matrix, so they're left out of the
+        layers and a new clockface color doesn't mean redrawing them all.
+        Layers moved between pixels are the exception, since they're shaded.
+        """
+        matrix = generate_empty_matrix()
+        for step in self.steps:
+            this_color = color or step.color or default_color
+            if this_color is None:
+                raise ValueError("No color given for {}".format(
+                                 step.group_name))
+            if step.procedural_animation:
+                # The frame changes over time, so there's nothing to cache
+                this_kwargs = {}
+                this_kwargs.update(kwargs)
+                this_kwargs.update(step.spatial)
+                add_items_to_matrix(
+                    [step.procedural_animation.get_next_frame(current_time), ],
+                    matrix,
+                    color=this_color, brightness=brightness, mask=step.mask,
+                    **this_kwargs)
+                continue
+            if step.data_key is None:
+                lookup_data = frame_number // self.fps % len(step.frames)
+            elif step.data_key in data:
+                lookup_data = data[step.data_key]
+            else:
+                raise ValueError("{} is not in the data given".format(
+                                 step.data_key))
+            layer_key = (id(step), _hashable(lookup_data))
+            layer = LAYER_CACHE.get(layer_key)
+            if layer is None:
+                if step.data_key is None:
+                    items, positions = step.frames[lookup_data]
+                else:
+                    items, positions = step.lookup(lookup_data)
+                layer = _render_layer(items, positions, mask=step.mask)
+                LAYER_CACHE.put(layer_key, layer)
+            layer_brightness = brightness
+            if step.motion is not None and layer[0] is not None:
+                layer = self.move_layer(step, layer_key, layer, frame_number,
+                                        this_color, brightness)
+                if layer[0].ndim == 3:
+                    # It's already at `brightness`, and scaling each pixel
+                    # to it would bring the shaded ones back up to full
+                    layer_brightness = None
+            layer_matrix, layer_x, layer_y, layer_halo = layer
+            if layer_matrix is not None:
+                add_to_matrix(layer_matrix, matrix, layer_x, layer_y,
+                              color=this_color, brightness=layer_brightness,
+                              transpose=False,
+                              mask=step.mask, halo=layer_halo, **kwargs)
+        return matrix
+
+    def move_layer(self, step, layer_key, layer, frame_number, color,
+                   brightness=None):
+        """
+        Moves the rendered `layer` of `step` to where its tween has it at
+        `frame_number`. Offsets are rounded to `SUBPIXEL_STEPS` of a pixel.
+        Layers that land between pixels are shaded, so they're drawn in
+        `color` at `brightness` and cached like other layers.
+        """
+        step_time = float(frame_number * step.fps // self.fps) / step.fps
+        dx, dy = step.motion.offset_at(step_time)
+        steps_x = int(round(dx * SUBPIXEL_STEPS))
+        steps_y = int(round(dy * SUBPIXEL_STEPS))
+        layer_matrix, layer_x, layer_y, layer_halo = layer
+        # Whole pixels just move the layer
+        layer_x += steps_x // SUBPIXEL_STEPS
+        layer_y += steps_y // SUBPIXEL_STEPS
+        steps_x %= SUBPIXEL_STEPS
+        steps_y %= SUBPIXEL_STEPS
+        if not steps_x and not steps_y:
+            return layer_matrix, layer_x, layer_y, layer_halo
+        if brightness:
+            color = set_brightness(color, brightness)
+        moved_key = layer_key + (tuple(color), steps_x, steps_y)
+        moved = LAYER_CACHE.get(moved_key)
+        if moved is None:
+            tinted = np.zeros(layer_matrix.shape + (3,), dtype=np.uint8)
+            tinted[layer_matrix] = color
+            moved_matrix = shift_subpixel(tinted, steps_x, steps_y,
+                                          SUBPIXEL_STEPS)
+            moved_halo = None
+            if step.mask:
+                moved_halo = get_halo(moved_matrix.any(axis=2))
+            moved = (moved_matrix, moved_halo)
+            LAYER_CACHE.put(moved_key, moved)
+        return moved[0], layer_x, layer_y, moved[1]
+
+
+def config_to_matrix(config, data, color=None, brightness=None, **kwargs):
+    """
+    Takes a configuration and data and generates a matrix using the two. The
+    configuration is compiled into a `RenderPlan` the first time it's used.
+    """
+    if id(config) not in RENDER_PLANS:
+        # Keep a reference to the config so that its id can't be reused
+        RENDER_PLANS[id(config)] = (config, RenderPlan(config))
+    _, plan = RENDER_PLANS[id(config)]
+    return plan.run(data, color=color, brightness=brightness, **kwargs)
@@ -0,0 +1,38 @@
+import bisect
+
+
+class Tween(object):
+    """
+    Moves a sprite through `keyframes`, a list of (seconds, (dx, dy)) offsets
+    in pixels, the first of which is at 0 seconds. In between keyframes the
+    offset is interpolated linearly, so it can land between pixels. The motion
+    loops every `period` seconds (a whole number, so it lines up with frame
+    animations), heading back to the first keyframe after the last one.
+    """
+    def __init__(self, keyframes, period):
+        if not keyframes or keyframes[0][0] != 0:
+            raise ValueError("The first keyframe must be at 0 seconds")
+        self.times = [float(keyframe_time) for keyframe_time, _ in keyframes]
+        if self.times != sorted(set(self.times)):
+            raise ValueError("Keyframes must be in order, one per time")
+        if int(period) != period or period <= self.times[-1]:
+            raise ValueError("The period must be a whole number of seconds "
+                             "after the last keyframe")
+        self.offsets = [(float(dx), float(dy)) for _, (dx, dy) in keyframes]
+        self.period = int(period)
+
+    def offset_at(self, current_time):
+        """Returns the (dx, dy) offset at `current_time` in seconds"""
+        current_time %= self.period
+        index = bisect.bisect_right(self.times, current_time) - 1
+        start_time = self.times[index]
+        start_x, start_y = self.offsets[index]
+        if index + 1 < len(self.times):
+            end_time = self.times[index + 1]
+            end_x, end_y = self.offsets[index + 1]
+        else:
+            end_time = self.period
+            end_x, end_y = self.offsets[0]
+        fraction = (current_time - start_time) / (end_time - start_time)
+        return (start_x + (end_x - start_x) * fraction,
+                start_y + (end_y - start_y) * fraction)
@@ -1,25 +1,37 @@
-import time
 from types import ModuleType
 
+import numpy as np
+
 from clockpi.constants import ARRAY_HEIGHT
 from clockpi.constants import ARRAY_WIDTH
-from clockpi.graphics.color_utils import set_brightness
+from clockpi.graphics.atlas import GLYPH_ATLAS
+from clockpi.graphics.color_utils import set_brightness_array
+from clockpi.graphics.mask import get_halo
 
 
 def generate_empty_matrix(fill_with=[0, 0, 0], width=ARRAY_WIDTH,
                           height=ARRAY_HEIGHT):
-    """Generates a matrix of zeros that can be referenced like:
+    """Generates a (width, height, 3) uint8 framebuffer that can be referenced
+    like:
         my_matrix[x_coordinate][y_coordinate]
     """
-    empty_matrix = []
-    for _ in xrange(width):
-        empty_matrix.append([fill_with] * height)
+    empty_matrix = np.empty((width, height, 3), dtype=np.uint8)
+    empty_matrix[:] = fill_with
     return empty_matrix
 
 
+def _shifted(padded, dx, dy):
+    """Returns the window of `padded` (which has a border of 1 on each side)
+    that is shifted by `dx`, `dy` from the center window.
+    """
+    width = padded.shape[0] - 2
+    height = padded.shape[1] - 2
+    return padded[1+dx:1+dx+width, 1+dy:1+dy+height]
+
+
 def add_to_matrix(partial_matrix, matrix, x, y, color=None, brightness=None,
                   transpose=True, bit_or=True, bit_and=False, bit_xor=False,
-                  mask=False, mask_amount=0.15):
+                  mask=False, mask_amount=0.15, halo=None):
     """
     Adds `partial_matrix` to `matrix` at `x`, `y`. If `color` is specified,
     `partial_matrix` will be copied using that color - otherwise, the color
@@ -31,104 +43,129 @@ def add_to_matrix(partial_matrix, matrix, x, y, color=None, brightness=None,
     bit_xor: do a bitwise XOR to determine the final pixel color
     mask: dim pixels if they're adjacent to ON pixels (including diagonals)
     mask_amount: amount to dim pixels as a percentage for the mask
+    halo: the mask's halo for `partial_matrix` if it was already computed
+          with `get_halo`
     """
-    mask_blacklist = generate_empty_matrix(False, len(matrix), len(matrix[0]))
     if color:
         assert len(color) == 3
-    if transpose:
-        partial_matrix_x_len = len(partial_matrix[0])
-        partial_matrix_y_len = len(partial_matrix)
+    # Hand-drawn alphanums are already packed in the atlas
+    glyph = GLYPH_ATLAS.get(partial_matrix) if transpose else None
+    if glyph is not None:
+        partial_matrix = glyph.is_on
+        halo = glyph.halo
+    else:
+        partial_matrix = np.asarray(partial_matrix)
+        if transpose:
+            partial_matrix = partial_matrix.swapaxes(0, 1)
+    # Clip the partial matrix to the part that lands inside of `matrix`
+    x_start = max(x, 0)
+    y_start = max(y, 0)
+    x_end = min(x + partial_matrix.shape[0], matrix.shape[0])
+    y_end = min(y + partial_matrix.shape[1], matrix.shape[1])
+    if x_start >= x_end or y_start >= y_end:
+        return
+    window = (slice(x_start-x, x_end-x), slice(y_start-y, y_end-y))
+    # The parts of the partial matrix that are cut off don't cast a halo
+    is_clipped = (x_end - x_start, y_end - y_start) != partial_matrix.shape[:2]
+    partial_matrix = partial_matrix[window]
+    if partial_matrix.ndim == 2:
+        # The partial matrix doesn't contain colors, so substitute in `color`
+        is_on = partial_matrix != 0
+        pm_color = color or [255, 255, 255]
+        pm_vals = np.empty(partial_matrix.shape + (3,), dtype=np.int32)
+        pm_vals[:] = pm_color
+    else:
+        pm_vals = partial_matrix.astype(np.int32)
+        is_on = pm_vals.any(axis=2)
+    if not is_on.any():
+        return
+    matrix_window = matrix[x_start:x_end, y_start:y_end]
+    matrix_vals = matrix_window.astype(np.int32)
+    if mask:
+        # Pixels are dimmed by the first ON neighbor that gets drawn, so an ON
+        # pixel that comes after another ON pixel (x, then y order) will be
+        # dimmed before being drawn
+        padded_on = np.pad(is_on, 1, 'constant')
+        is_dimmed_first = is_on & matrix_vals.any(axis=2) & (
+            _shifted(padded_on, -1, -1) | _shifted(padded_on, -1, 0) |
+            _shifted(padded_on, -1, 1) | _shifted(padded_on, 0, -1))
+        matrix_vals[is_dimmed_first] = set_brightness_array(
+            matrix_vals[is_dimmed_first], mask_amount, as_percentage=True,
+            allow_zero=True)
+    is_overwrite = not (bit_and or bit_xor or bit_or)
+    # A glyph drawn over dark pixels (or overwriting them) comes out exactly
+    # as its tinted version in the atlas, so it can just be copied
+    use_tinted_glyph = glyph is not None and not bit_and and (
+        (is_overwrite and any(pm_color)) or not matrix_vals[is_on].any())
+    if use_tinted_glyph:
+        tinted_glyph = GLYPH_ATLAS.tinted(glyph, color, brightness)[window]
+        np.copyto(matrix_window, tinted_glyph,
+                  where=is_on[:, :, np.newaxis])
     else:
-        partial_matrix_x_len = len(partial_matrix)
-        partial_matrix_y_len = len(partial_matrix[0])
-    for xx in range(partial_matrix_x_len):
-        for yy in range(partial_matrix_y_len):
-            is_inside = (len(matrix) > (x+xx) and (x+xx) >= 0 and
-                         len(matrix[0]) > (y+yy) and (y+yy) >= 0)
-            if not is_inside:
-                continue
-            matrix_val = matrix[x+xx][y+yy]
-            if transpose:
-                pm_val = partial_matrix[yy][xx]
-            else:
-                pm_val = partial_matrix[xx][yy]
-            # If the partial matrix doesn't contain colors, substitute
-            # in `color` or the matrix color
-            if type(pm_val) not in (tuple, list):
-                if pm_val:
-                    pm_val = color or [255, 255, 255]
-                else:
-                    # pm_val is an off pixel, can be skipped
-                    continue
-            else:
-                # pm_val is a color
-                if not any(pm_val):
-                    # pm_val is an off pixel, can be skipped
-                    continue
-            if bit_and:
-                if any(matrix_val) and any(pm_val):
-                    # Take the average
-                    final_val = [sum(z)/2 for z in zip(matrix_val, pm_val)]
-                else:
-                    final_val = [0, 0, 0]
-            elif bit_xor:
-                if any(matrix_val) and any(pm_val):
-                    final_val = [0, 0, 0]
-                else:
-                    # One or the other or both are [0, 0, 0]
-                    final_val = [sum(z) for z in zip(matrix_val, pm_val)]
-            elif bit_or:
-                # Use the greater of each rgb value
-                final_val = [max(z) for z in zip(matrix_val, pm_val)]
-            else:
-                # Just overwrite the matrix with the partial matrix
-                if any(pm_val):
-                    final_val = pm_val
-                else:
-                    final_val = matrix_val
-            if brightness:
-                final_val = set_brightness(final_val, brightness)
-            matrix[x+xx][y+yy] = final_val
-            mask_blacklist[x+xx][y+yy] = True
-            if mask:
-                # Knock back all adjacent pixels (including diagonals)
-                for ii in xrange(-1, 2):
-                    for jj in xrange(-1, 2):
-                        if ii == 0 and jj == 0:
-                            # Don't check our current/center pixel
-                            continue
-                        matrix_x = x + xx + ii
-                        matrix_y = y + yy + jj
-                        # Check if we're in bounds
-                        in_matrix = (
-                            matrix_x >= 0 and matrix_y >= 0 and
-                            matrix_x < len(matrix) and
-                            matrix_y < len(matrix[0]))
-                        if not in_matrix:
-                            continue
-                        if not mask_blacklist[matrix_x][matrix_y]:
-                            mask_blacklist[matrix_x][matrix_y] = True
-                            old_pixel = matrix[matrix_x][matrix_y]
-                            if not any(old_pixel):
-                                continue
-                            new_pixel = set_brightness(
-                                matrix[matrix_x][matrix_y], mask_amount,
-                                as_percentage=True, allow_zero=True)
-                            matrix[matrix_x][matrix_y] = new_pixel
+        pm_val_is_on = pm_vals.any(axis=2)[:, :, np.newaxis]
+        matrix_val_is_on = matrix_vals.any(axis=2)[:, :, np.newaxis]
+        if bit_and:
+            # Take the average
+            final_vals = np.where(pm_val_is_on & matrix_val_is_on,
+                                  (matrix_vals + pm_vals) // 2, 0)
+        elif bit_xor:
+            # One or the other or both are [0, 0, 0]
+            final_vals = np.where(pm_val_is_on & matrix_val_is_on,
+                                  0, matrix_vals + pm_vals)
+        elif bit_or:
+            # Use the greater of each rgb value
+            final_vals = np.maximum(matrix_vals, pm_vals)
+        else:
+            # Just overwrite the matrix with the partial matrix
+            final_vals = np.where(pm_val_is_on, pm_vals, matrix_vals)
+        if brightness:
+            final_vals[is_on] = set_brightness_array(final_vals[is_on],
+                                                     brightness)
+        matrix_window[is_on] = final_vals[is_on]
+    if mask:
+        # Knock back all pixels adjacent to ON pixels (including diagonals)
+        if halo is None or is_clipped:
+            halo = get_halo(is_on)
+        # The halo is one pixel bigger than the partial matrix on every side
+        halo_x_start = max(x_start - 1, 0)
+        halo_y_start = max(y_start - 1, 0)
+        halo_x_end = min(x_end + 1, matrix.shape[0])
+        halo_y_end = min(y_end + 1, matrix.shape[1])
+        is_halo = halo[
+            1 + halo_x_start - x_start:1 + halo_x_end - x_start,
+            1 + halo_y_start - y_start:1 + halo_y_end - y_start]
+        halo_window = matrix[halo_x_start:halo_x_end, halo_y_start:halo_y_end]
+        halo_window[is_halo] = set_brightness_array(
+            halo_window[is_halo], mask_amount, as_percentage=True,
+            allow_zero=True)
 
 
-def add_items_to_matrix(items, matrix, origin_x=None, origin_y=None,
-                        center_x=None, center_y=None, spacing=0, **kwargs):
-    """Adds a left-aligned 'sentence', which consists of `items`, which are
-    separated by `spacing`, which can be an integer, or a list containing
-    spacing distances between each item in `items` (len = n - 1)
+def shift_subpixel(layer, steps_x, steps_y, subpixel_steps):
+    """
+    Returns a copy of `layer` (a (width, height, 3) matrix) moved right by
+    `steps_x` and down by `steps_y` out of `subpixel_steps` steps of a pixel.
+    Each pixel is shared out over the ones it now overlaps, in proportion to
+    how much of them it covers, so the copy is one pixel bigger each way.
+    """
+    width, height, _ = layer.shape
+    values = layer.astype(np.uint16)
+    moved = np.zeros((width + 1, height + 1, 3), dtype=np.uint16)
+    # The four weights add up to subpixel_steps ** 2, which keeps the sum
+    # inside of uint16 as long as there are no more than 16 steps
+    for dx, weight_x in ((0, subpixel_steps - steps_x), (1, steps_x)):
+        for dy, weight_y in ((0, subpixel_steps - steps_y), (1, steps_y)):
+            if weight_x and weight_y:
+                moved[dx:dx+width, dy:dy+height] += values * (weight_x *
+                                                              weight_y)
+    moved //= subpixel_steps ** 2
+    return moved.astype(np.uint8)
 
-    origin_x: top left corner X position (can use center_x instead)
-    origin_y: top left corner Y position (can use center_y instead)
-    center_x: center X position (optional). This will be the centerline of the
-              resulting 'sentence'.
-    center_y: center Y position (optional). This will be the centerline of the
-              resulting 'sentence'.
+
+def layout_items(item_sizes, origin_x=None, origin_y=None, center_x=None,
+                 center_y=None, spacing=0):
+    """Works out where each item of a left-aligned 'sentence' goes. See
+    `add_items_to_matrix`. `item_sizes` is a list of (width, height) for each
+    item. Returns a list of the top left corner (x, y) of each item.
     """
     if (origin_x is None and center_x is None) or all([origin_x, center_x]):
         raise ValueError("Must specify either origin_x or center_x")
@@ -137,10 +174,10 @@ def add_items_to_matrix(items, matrix, origin_x=None, origin_y=None,
     if center_x or center_y:
         total_width = 0
         total_height = 0
-        for ii in xrange(len(items)):
-            item = items[ii]
-            total_width += len(item[0])
-            total_height = max(total_height, len(item))
+        for ii in xrange(len(item_sizes)):
+            width, height = item_sizes[ii]
+            total_width += width
+            total_height = max(total_height, height)
             if ii > 0:
                 space = spacing
                 if hasattr(spacing, '__iter__'):
@@ -152,13 +189,34 @@ def add_items_to_matrix(items, matrix, origin_x=None, origin_y=None,
             origin_y = int(center_y - total_height / 2)
     x = origin_x
     y = origin_y
-    for ii in xrange(len(items)):
-        item = items[ii]
+    positions = []
+    for ii in xrange(len(item_sizes)):
         if ii > 0:
             space = spacing
             if hasattr(spacing, '__iter__'):
                 space = spacing[ii-1]
-            x += space + len(items[ii-1][0])
+            x += space + item_sizes[ii-1][0]
+        positions.append((x, y))
+    return positions
+
+
+def add_items_to_matrix(items, matrix, origin_x=None, origin_y=None,
+                        center_x=None, center_y=None, spacing=0, **kwargs):
+    """Adds a left-aligned 'sentence', which consists of `items`, which are
+    separated by `spacing`, which can be an integer, or a list containing
+    spacing distances between each item in `items` (len = n - 1)
+
+    origin_x: top left corner X position (can use center_x instead)
+    origin_y: top left corner Y position (can use center_y instead)
+    center_x: center X position (optional). This will be the centerline of the
+              resulting 'sentence'.
+    center_y: center Y position (optional). This will be the centerline of the
+              resulting 'sentence'.
+    """
+    item_sizes = [(len(item[0]), len(item)) for item in items]
+    positions = layout_items(item_sizes, origin_x, origin_y, center_x,
+                             center_y, spacing)
+    for item, (x, y) in zip(items, positions):
         add_to_matrix(item, matrix, x, y, **kwargs)
 
 
@@ -201,56 +259,3 @@ def data_to_alphanums(data_list, alphanum_source):
                                           item=item,
                                           source_type=type(alphanum_source)))
     return alphanum_list
-
-
-def config_to_matrix(config, data, color=None, brightness=None, **kwargs):
-    """
-    Takes a configuration and data and generates a matrix using the two.
-
-    If your config contains 'font_choices' each item in the list will be tried
-    and the first one that works will be used.
-
-    The config can also a matrix under the key 'item', in case you just want to
-    add a static image.
-    """
-    matrix = generate_empty_matrix()
-    for group_name, group_config in config.iteritems():
-        spatial = group_config['spatial']
-        this_color = color or group_config['color']
-        mask = group_config.get('mask', False)
-        this_kwargs = {}
-        this_kwargs.update(kwargs)
-        this_kwargs.update(spatial)
-        if 'item' in group_config:
-            group_display = [group_config['item'], ]
-        elif 'procedural_animation' in group_config:
-            anim_obj = group_config['procedural_animation']
-            group_display = [anim_obj.get_next_frame(), ]
-        else:
-            if 'animation' in group_name:
-                lookup_data = (int(time.time()) % len(group_config['font']))
-            else:
-                data_key = group_config['data_key']
-                if data_key in data:
-                    lookup_data = data[data_key]
-                else:
-                    raise ValueError("{} is not in the data given".format(
-                                     data_key))
-            if 'font_choices' in group_config:
-                font_choices = group_config['font_choices']
-                for font_choice in font_choices:
-                    try:
-                        group_display = data_to_alphanums(lookup_data,
-                                                          font_choice)
-                        break
-                    except Exception:
-                        pass
-                else:
-                    raise ValueError("None of the font choices for {} "
-                                     "worked.".format(group_name))
-            else:
-                group_display = data_to_alphanums(lookup_data,
-                                                  group_config['font'])
-        add_items_to_matrix(group_display, matrix, color=this_color,
-                            brightness=brightness, mask=mask, **this_kwargs)
-    return matrix
@@ -4,21 +4,45 @@ import argparse
 import logging
 import time
 
-from rgbmatrix import RGBMatrix, RGBMatrixOptions
+from clockpi.clockface_config import BACKGROUNDS
+from clockpi.constants import API_FETCH_MODE
+from clockpi.constants import CLOCKFACE_BACKGROUND
+from clockpi.constants import DEADLINE_MISS_TOLERANCE
+from clockpi.constants import MAX_FPS
+from clockpi.display import DISPLAY_BACKENDS
+from clockpi.display import make_display
 from clockpi.graphics.graphics import LEDPi
-from clockpi.utils import send_matrix
+from clockpi.metrics import FrameMetrics
+from clockpi.scheduler import FrameScheduler
+from clockpi.update_clock_info import ClockInfoUpdater
+from clockpi.update_clock_info import FETCH_MODES
 
 
-def main(driver, run_once):
+def main(display, run_once, max_fps=MAX_FPS, metrics_textfile=None,
+         background=CLOCKFACE_BACKGROUND, fetch_mode=API_FETCH_MODE):
     first_run = True
-    ledpi = LEDPi()
+    metrics = FrameMetrics(metrics_textfile)
+    ledpi = LEDPi(clock_info_updater=ClockInfoUpdater(fetch_mode=fetch_mode),
+                  metrics=metrics, background=background)
+    scheduler = FrameScheduler(max_fps)
     while not run_once or first_run:
         first_run = False
-        matrix = ledpi.display_clock()
-        if matrix:
-            send_matrix(driver, matrix)
+        with metrics.timer('frame'):
+            matrix = ledpi.display_clock()
+            if matrix is not None:
+                with metrics.timer('push'):
+                    sent = display.send_matrix(matrix)
+                metrics.count('frames_sent' if sent else 'frames_skipped')
+        metrics.maybe_export()
+        if not run_once:
+            scheduler.wait(ledpi.next_frame_time(),
+                           ledpi.clock_info_updater.data_connections(
+                               ledpi.data))
+            if scheduler.lateness > DEADLINE_MISS_TOLERANCE:
+                metrics.count('deadline_misses')
+    metrics.export()
     time.sleep(3)
-    driver.Clear()
+    display.clear()
 
 
 if __name__ == '__main__':
@@ -28,15 +52,21 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser()
     parser.add_argument('--run-once', action='store_true')
+    parser.add_argument('--max-fps', type=float, default=MAX_FPS)
+    parser.add_argument('--display', choices=DISPLAY_BACKENDS,
+                        default='rgbmatrix')
+    parser.add_argument('--output-dir',
+                        help='Where the png and raw displays write frames')
+    parser.add_argument('--metrics-textfile',
+                        help='Prometheus textfile to export frame metrics to')
+    parser.add_argument('--background', choices=sorted(BACKGROUNDS),
+                        default=CLOCKFACE_BACKGROUND)
+    parser.add_argument('--fetch-mode', choices=FETCH_MODES,
+                        default=API_FETCH_MODE,
+                        help='Run the API clients in their own processes, '
+                             'or on a thread')
     args = parser.parse_args()
 
-    options = RGBMatrixOptions()
-    options.rows = 32
-    options.cols = 32
-    options.chain_length = 2
-    options.parallel = 1
-    options.multiplexing = 0
-    options.hardware_mapping = 'adafruit-hat-pwm'
-    driver = RGBMatrix(options=options)
-
-    main(driver, args.run_once)
+    main(make_display(args.display, args.output_dir), args.run_once,
+         args.max_fps, args.metrics_textfile, args.background,
+         args.fetch_mode)
@@ -0,0 +1,189 @@
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+
+from clockpi.constants import METRICS_EXPORT_INTERVAL
+from clockpi.constants import METRICS_WINDOW
+
+
+logger = logging.getLogger(__name__)
+
+
+class RollingHistogram(object):
+    """Keeps the last `window` samples, so percentiles follow recent frames"""
+    def __init__(self, window=METRICS_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0  # Samples ever recorded
+        self.total = 0.0
+
+    def record(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        """Returns (p50, p95, max) of the window, or None if it's empty"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        last = len(ordered) - 1
+        return (ordered[int(round(last * 0.5))],
+                ordered[int(round(last * 0.95))],
+                ordered[last])
+
+
+class _StageTimer(object):
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.histogram.record(time.time() - self.start)
+
+
+class FrameMetrics(object):
+    """
+    Timings for each stage of drawing a frame, kept as rolling histograms,
+    along with counters like frames sent and skipped. Recording only appends
+    to a bounded deque, so it can be left on; the percentiles are only worked
+    out when exporting, which `maybe_export` does every `export_interval`
+    seconds, to the log and to a Prometheus textfile if `textfile_path` is
+    given (for node_exporter's textfile collector). The hits and misses of
+    the caches passed to `watch_cache` are exported along with them.
+    """
+    COUNTERS = ('frames_sent', 'frames_skipped', 'frames_dropped',
+                'deadline_misses')
+
+    def __init__(self, textfile_path=None,
+                 export_interval=METRICS_EXPORT_INTERVAL,
+                 window=METRICS_WINDOW):
+        self.textfile_path = textfile_path
+        self.export_interval = export_interval
+        self.window = window
+        self.histograms = {}
+        self.timers = {}
+        self.counters = dict.fromkeys(self.COUNTERS, 0)
+        self.caches = {}  # Name -> LRUCache
+        self.last_export_time = time.time()
+        self.last_export_frames = 0
+        self.fps = 0.0
+
+    def histogram(self, stage):
+        if stage not in self.histograms:
+            self.histograms[stage] = RollingHistogram(self.window)
+        return self.histograms[stage]
+
+    def timer(self, stage):
+        """Returns a context manager that records how long `stage` took"""
+        stage_timer = self.timers.get(stage)
+        if stage_timer is None:
+            stage_timer = _StageTimer(self.histogram(stage))
+            self.timers[stage] = stage_timer
+        return stage_timer
+
+    def record(self, stage, seconds):
+        self.histogram(stage).record(seconds)
+
+    def count(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def watch_cache(self, name, cache):
+        """Exports the stats of `cache` (an `LRUCache`) as `name`"""
+        self.caches[name] = cache
+
+    def maybe_export(self, current_time=None):
+        """Exports if it's been `export_interval` since the last export"""
+        if current_time is None:
+            current_time = time.time()
+        if current_time - self.last_export_time >= self.export_interval:
+            self.export(current_time)
+
+    def export(self, current_time=None):
+        if current_time is None:
+            current_time = time.time()
+        elapsed = current_time - self.last_export_time
+        frames = self.counters['frames_sent']
+        if elapsed > 0:
+            self.fps = (frames - self.last_export_frames) / elapsed
+        self.last_export_time = current_time
+        self.last_export_frames = frames
+        logger.info(self.format_log())
+        if self.textfile_path:
+            self.write_textfile()
+
+    def format_log(self):
+        parts = ['fps {:.2f}'.format(self.fps)]
+        parts.extend('{} {}'.format(counter, self.counters[counter])
+                     for counter in sorted(self.counters))
+        for stage in sorted(self.histograms):
+            summary = self.histograms[stage].summary()
+            if summary:
+                parts.append('{} p50/p95/max {:.2f}/{:.2f}/{:.2f} ms'.format(
+                             stage, *[value * 1000 for value in summary]))
+        for name in sorted(self.caches):
+            stats = self.caches[name].stats()
+            parts.append('{} cache hits/misses/size {}/{}/{}'.format(
+                         name, stats['hits'], stats['misses'],
+                         stats['size']))
+        return ', '.join(parts)
+
+    def format_textfile(self):
+        lines = [
+            '# HELP clockpi_stage_seconds Time taken by each stage of a '
+            'frame, over the last {} frames'.format(self.window),
+            '# TYPE clockpi_stage_seconds summary',
+        ]
+        for stage in sorted(self.histograms):
+            histogram = self.histograms[stage]
+            summary = histogram.summary()
+            if summary:
+                for quantile, value in zip(('0.5', '0.95', '1'), summary):
+                    lines.append(
+                        'clockpi_stage_seconds{{stage="{}",quantile="{}"}} '
+                        '{:.6f}'.format(stage, quantile, value))
+            lines.append(
+                'clockpi_stage_seconds_sum{{stage="{}"}} {:.6f}'.format(
+                    stage, histogram.total))
+            lines.append(
+                'clockpi_stage_seconds_count{{stage="{}"}} {}'.format(
+                    stage, histogram.count))
+        for counter in sorted(self.counters):
+            lines.append('# TYPE clockpi_{}_total counter'.format(counter))
+            lines.append('clockpi_{}_total {}'.format(
+                         counter, self.counters[counter]))
+        if self.caches:
+            lines.append('# TYPE clockpi_cache_hits_total counter')
+            lines.append('# TYPE clockpi_cache_misses_total counter')
+            lines.append('# TYPE clockpi_cache_entries gauge')
+        for name in sorted(self.caches):
+            stats = self.caches[name].stats()
+            lines.append('clockpi_cache_hits_total{{cache="{}"}} {}'.format(
+                         name, stats['hits']))
+            lines.append('clockpi_cache_misses_total{{cache="{}"}} {}'.format(
+                         name, stats['misses']))
+            lines.append('clockpi_cache_entries{{cache="{}"}} {}'.format(
+                         name, stats['size']))
+        lines.append('# TYPE clockpi_fps gauge')
+        lines.append('clockpi_fps {:.3f}'.format(self.fps))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self):
+        """Writes the metrics next to the textfile and renames it over it, so
+        the collector never reads a half written file.
+        """
+        try:
+            directory = os.path.dirname(os.path.abspath(self.textfile_path))
+            fd, temp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w') as temp_file:
+                temp_file.write(self.format_textfile())
+            os.chmod(temp_path, 0o644)
+            os.rename(temp_path, self.textfile_path)
+        except Exception:
+            logger.exception('Exception while writing metrics to {}'.format(
+                             self.textfile_path))
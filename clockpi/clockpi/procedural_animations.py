@@ -1,11 +1,18 @@
-import random
+import math
 import time
+from collections import deque
+
+import numpy as np
 
 
 class ProceduralAnimation(object):
     ANIMATION_FREQ = 1  # Hz
 
     def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Goes back to the state the animation started in"""
         self.last_frame_time = 0
         self.current_frame = []
 
@@ -18,51 +25,169 @@ class ProceduralAnimation(object):
             return True
         return False
 
-    def get_next_frame(self):
+    def next_frame_time(self):
+        """Returns the time at which the next frame will be drawn"""
+        return self.last_frame_time + 1.0 / self.ANIMATION_FREQ
+
+    def get_next_frame(self, current_time=None):
         """
-        Returns the next frame if it's time for it, otherwise, return the frame
-        that was already being displayed. The frame's first index is the Y
+        Returns the next frame if it's time for it at `current_time` (now by
+        default), otherwise, return the frame that was already being
+        displayed. The frame's first index is the Y
         coordinate, and the second is the X, like if they were the other hand-
         drawn artwork.
         """
-        if not self.should_draw_next_frame():
+        if not self.should_draw_next_frame(current_time):
             return self.current_frame
         raise NotImplementedError
 
 
 class ProceduralRain(ProceduralAnimation):
     """
-    Uses the frame like a queue, adding to the front and popping off the back
-    since the rain is just falling down.
+    Keeps the rain in a circular buffer of rows with a moving head, so making
+    the rain fall is just moving the head up a row and drawing new droplets
+    there, instead of shifting every row down. Each frame handed out is a
+    read-only copy, so it doesn't change under whoever is drawing it.
+
+    `speed` is the number of rows the rain falls every second, which can be
+    more than one since frames are synced to fractions of a second. If frames
+    come slower than that, the rain falls more than one row at a time to keep
+    up.
     """
     DROPLET_DENSITY = 0.12  # Average number of droplets per pixel
     DROPLET_LENGTH = 2  # Vertical length of droplets
 
-    def __init__(self, animation_width, animation_height):
-        super(ProceduralRain, self).__init__()
+    def __init__(self, animation_width, animation_height, speed=1):
         self.animation_width = animation_width
         self.animation_height = animation_height
-        self.current_frame = []
-        # Generate a blank frame
-        for _ in xrange(self.animation_height):
-            self.current_frame.append([0] * self.animation_width)
+        self.ANIMATION_FREQ = speed
+        super(ProceduralRain, self).__init__()
+
+    def reset(self):
+        super(ProceduralRain, self).reset()
+        self.rows = np.zeros((self.animation_height, self.animation_width),
+                             dtype=np.uint8)
+        self.head = 0  # Index of the top row of the frame in `rows`
+        self.current_frame = self.frame_view()
 
-    def should_draw_next_frame(self):
-        # Sync up with clock seconds by casting to int
-        current_time = int(time.time())
+    def frame_view(self):
+        """Returns the rain from the top row down, as a read-only array"""
+        frame = np.roll(self.rows, -self.head, axis=0)
+        frame.flags.writeable = False
+        return frame
+
+    def should_draw_next_frame(self, current_time=None):
+        if not current_time:
+            current_time = time.time()
+        # Sync up with clock seconds, or fractions of one for faster rain
+        current_time = (math.floor(current_time * self.ANIMATION_FREQ) /
+                        self.ANIMATION_FREQ)
         return super(ProceduralRain, self).should_draw_next_frame(current_time)
 
-    def get_next_frame(self):
-        if not self.should_draw_next_frame():
+    def fall(self):
+        """Moves the rain down a row"""
+        # The bottom row, with the oldest raindrops, becomes the new top row
+        self.head = (self.head - 1) % self.animation_height
+        droplets = (np.random.random_sample(self.animation_width) <=
+                    self.DROPLET_DENSITY)
+        self.rows[self.head] = droplets
+        # Draw the droplets downwards
+        for yy in xrange(1, min(self.DROPLET_LENGTH, self.animation_height)):
+            self.rows[(self.head + yy) % self.animation_height] |= droplets
+
+    def get_next_frame(self, current_time=None):
+        last_frame_time = self.last_frame_time
+        if not self.should_draw_next_frame(current_time):
+            return self.current_frame
+        rows_due = int(round((self.last_frame_time - last_frame_time) *
+                             self.ANIMATION_FREQ))
+        # Past a screenful, the rows would just fall out of sight
+        for _ in xrange(max(1, min(rows_due, self.animation_height))):
+            self.fall()
+        self.current_frame = self.frame_view()
+        return self.current_frame
+
+
+class GameOfLife(ProceduralAnimation):
+    """
+    Conway's game of life on a board that wraps around at the edges. Every
+    cell's neighbours are counted at once by adding up shifted slices of a
+    padded copy of the board, one direction at a time. The board is reseeded
+    when it dies out or goes back to a state from the last few generations,
+    which catches still lifes and the common oscillators.
+    """
+    ANIMATION_FREQ = 4  # Hz
+    SEED_DENSITY = 0.3  # Chance of a cell starting out alive
+    STAGNATION_HISTORY = 12  # Number of generations to look back for repeats
+
+    def __init__(self, animation_width, animation_height,
+                 speed=ANIMATION_FREQ):
+        self.animation_width = animation_width
+        self.animation_height = animation_height
+        self.ANIMATION_FREQ = speed
+        # The board with a one cell border of the cells it wraps around to
+        self.padded = np.zeros((animation_height + 2, animation_width + 2),
+                               dtype=np.uint8)
+        self.row_sums = np.zeros((animation_height + 2, animation_width),
+                                 dtype=np.uint8)
+        self.block_sums = np.zeros((animation_height, animation_width),
+                                   dtype=np.uint8)
+        super(GameOfLife, self).__init__()
+
+    def reset(self):
+        super(GameOfLife, self).reset()
+        self.reseeds = 0
+        self.seed()
+
+    def seed(self):
+        """Starts over with a random board"""
+        self.board = (np.random.random_sample(
+            (self.animation_height, self.animation_width)) <
+            self.SEED_DENSITY).astype(np.uint8)
+        self.history = deque(maxlen=self.STAGNATION_HISTORY)
+        self.current_frame = self.frame_view()
+
+    def frame_view(self):
+        """Returns the board as a read-only array"""
+        frame = self.board.copy()
+        frame.flags.writeable = False
+        return frame
+
+    def step(self):
+        """Moves the board on a generation"""
+        padded = self.padded
+        padded[1:-1, 1:-1] = self.board
+        padded[0, 1:-1] = self.board[-1]
+        padded[-1, 1:-1] = self.board[0]
+        # The corners come along with the columns
+        padded[:, 0] = padded[:, -2]
+        padded[:, -1] = padded[:, 1]
+        # Add up the 3x3 block around each cell, which includes the cell
+        np.add(padded[:, :-2], padded[:, 1:-1], out=self.row_sums)
+        self.row_sums += padded[:, 2:]
+        np.add(self.row_sums[:-2], self.row_sums[1:-1], out=self.block_sums)
+        self.block_sums += self.row_sums[2:]
+        # A block of 3 is a birth or survival with 2 neighbours, and a block
+        # of 4 is survival with 3 neighbours
+        self.board = ((self.block_sums == 3) |
+                      ((self.block_sums == 4) & (self.board == 1))).view(
+                          np.uint8)
+
+    def is_stagnant(self):
+        if not self.board.any():
+            return True
+        state = self.board.tobytes()
+        if state in self.history:
+            return True
+        self.history.append(state)
+        return False
+
+    def get_next_frame(self, current_time=None):
+        if not self.should_draw_next_frame(current_time):
             return self.current_frame
-        # Remove the old raindrops at the end of the queue
-        self.current_frame.pop()
-        # Add new droplets
-        self.current_frame.insert(0, [0] * self.animation_width)
-        for xx in xrange(self.animation_width):
-            if random.random() <= self.DROPLET_DENSITY:
-                # Draw the droplet downwards
-                for yy in xrange(self.DROPLET_LENGTH):
-                    if yy < self.animation_height:
-                        self.current_frame[yy][xx] = 1
+        self.step()
+        if self.is_stagnant():
+            self.reseeds += 1
+            self.seed()
+        self.current_frame = self.frame_view()
         return self.current_frame
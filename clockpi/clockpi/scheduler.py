@@ -0,0 +1,56 @@
+import math
+import select
+import time
+
+from clockpi.constants import MAX_FPS
+
+
+def next_second_boundary(current_time=None):
+    """Returns the time of the next wall clock second"""
+    if current_time is None:
+        current_time = time.time()
+    return math.floor(current_time) + 1
+
+
+class FrameScheduler(object):
+    """
+    Sleeps between frames until the next time a frame could look different,
+    instead of redrawing as fast as possible. A frame is due at the given
+    deadline, or as soon as data arrives on one of the given connections,
+    but never more often than `max_fps`.
+    """
+    def __init__(self, max_fps=MAX_FPS):
+        self.min_frame_interval = 1.0 / max_fps
+        self.last_frame_time = 0
+        # How long after its deadline the last wait ended, if it wasn't woken
+        # up by a connection
+        self.lateness = 0.0
+
+    def wait(self, deadline, connections=()):
+        """
+        Blocks until `deadline` (a `time.time()` timestamp) or until one of
+        `connections` (anything with a `fileno`) is readable. Returns True if
+        woken up by a connection.
+        """
+        earliest = self.last_frame_time + self.min_frame_interval
+        now = time.time()
+        if now < earliest:
+            time.sleep(earliest - now)
+        woken_by_data = False
+        while True:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            if connections:
+                readable, _, _ = select.select(connections, [], [], timeout)
+                if readable:
+                    woken_by_data = True
+                    break
+            else:
+                time.sleep(timeout)
+        self.last_frame_time = time.time()
+        if woken_by_data:
+            self.lateness = 0.0
+        else:
+            self.lateness = self.last_frame_time - deadline
+        return woken_by_data
@@ -3,5 +3,8 @@ DIRECTIONS_DESTINATION = '123 My Street, My City, CA 98754, USA'
 DIRECTIONS_START_HOUR = 7  # Inclusive
 DIRECTIONS_END_HOUR = 11  # Non-inclusive
 GMAPS_DIRECTIONS_API_KEY = 'api_key'
+# Optional, sunrise and sunset come from the astro API without them
+LATITUDE = 37.7749  # Degrees, north is positive
+LONGITUDE = -122.4194  # Degrees, east is positive
 W_GOV_WEATHER_URL = 'https://api.weather.gov/points/LAT-LONG/forecast/hourly'  # noqa
 ASTRO_API_URL = 'https://api.sunrise-sunset.org/json?lat=LAT&lng=LONG'
@@ -0,0 +1,162 @@
+import ctypes
+import math
+import time
+from array import array
+from datetime import datetime
+from multiprocessing import Lock
+from multiprocessing import Pipe
+from multiprocessing.sharedctypes import RawArray
+from multiprocessing.sharedctypes import RawValue
+
+from enum import Enum
+
+
+DOORBELL = b'\x01'  # Sent down the pipe after new data is published
+
+
+def _encode(value, kind):
+    if value is None:
+        return float('nan')
+    if kind is datetime:
+        return time.mktime(value.timetuple()) + value.microsecond / 1e6
+    if issubclass(kind, Enum):
+        return float(value.value)
+    return float(value)
+
+
+def _decode(value, kind):
+    if kind is datetime:
+        return datetime.fromtimestamp(value)
+    if issubclass(kind, Enum):
+        return kind(int(value))
+    return kind(value)
+
+
+class _Channel(object):
+    """The parts of a channel that don't depend on where the data is kept"""
+    def __init__(self, fields):
+        self.fields = list(fields)
+        self.keys = set(key for key, _ in self.fields)
+        self.renderer_pipe, self.client_pipe = Pipe()
+        self.last_published = None  # What the client last published
+
+    def encode(self, data):
+        """Returns a double for each of the fields in `data`"""
+        unknown = set(data) - self.keys
+        if unknown:
+            raise ValueError("{} not in the channel's fields".format(
+                             ', '.join(sorted(unknown))))
+        return [_encode(data.get(key), kind) for key, kind in self.fields]
+
+    def has_changed(self, values):
+        """
+        Returns True if the encoded `values` aren't what was last published,
+        and remembers them if so. They're compared as bytes, so missing
+        values (NaN) are equal to each other.
+        """
+        packed = array('d', values).tostring()
+        if packed == self.last_published:
+            return False
+        self.last_published = packed
+        return True
+
+    def ring(self):
+        self.client_pipe.send_bytes(DOORBELL)
+
+    def drain(self):
+        while self.renderer_pipe.poll():
+            self.renderer_pipe.recv_bytes()
+
+
+class StateChannel(_Channel):
+    """
+    Hands the data from an API client to the renderer through shared memory,
+    so the renderer can read the latest data every frame without blocking or
+    unpickling anything.
+
+    The data is a dict with the keys in `fields`, a list of (key, type) where
+    the type is bool, int, float, datetime or an Enum. Each value is kept as a
+    double, with NaN for a missing key, along with a version that goes up
+    every time different data is published. Publishing the same data again
+    does nothing, so the renderer has nothing to redo. The record is guarded
+    by a lock (which also keeps the reads and writes of its parts in order
+    on CPUs that would reorder them). The renderer only tries to take it, and
+    if a write is in progress it gets the data on the next frame.
+
+    After publishing, the client rings a doorbell on the pipe, so a renderer
+    waiting on `renderer_pipe` wakes up. Messages from the renderer to the
+    client (like enabling or disabling it) still go the other way on the pipe.
+    """
+    def __init__(self, fields):
+        super(StateChannel, self).__init__(fields)
+        self.lock = Lock()
+        self.shared_version = RawValue(ctypes.c_ulong, 0)
+        self.values = RawArray(ctypes.c_double, len(self.fields))
+
+    def publish(self, data):
+        """Writes `data` for the renderer to pick up. Called by the client."""
+        values = self.encode(data)
+        if not self.has_changed(values):
+            return
+        with self.lock:
+            self.values[:] = values
+            self.shared_version.value += 1
+        self.ring()
+
+    @property
+    def version(self):
+        """Goes up every time data is published, 0 means nothing has been"""
+        return self.shared_version.value
+
+    def read(self, last_version=0):
+        """
+        Returns (version, data) for the latest data. `data` is None if it
+        hasn't changed since `last_version`, or if it's in the middle of being
+        written, in which case the next read will get it. Never blocks.
+        """
+        self.drain()
+        if not self.lock.acquire(False):
+            return last_version, None
+        try:
+            version = self.shared_version.value
+            if version == last_version:
+                return last_version, None
+            values = self.values[:]
+        finally:
+            self.lock.release()
+        data = dict((key, _decode(value, kind))
+                    for (key, kind), value in zip(self.fields, values)
+                    if not math.isnan(value))
+        return version, data
+
+
+class LocalStateChannel(_Channel):
+    """
+    A `StateChannel` for a client that runs on a thread in the renderer's
+    process. The data is handed over as a new dict, swapped in along with its
+    version in one assignment, so the renderer always sees a whole snapshot
+    and nothing has to be encoded.
+    """
+    def __init__(self, fields):
+        super(LocalStateChannel, self).__init__(fields)
+        self.latest = (0, None)  # (version, data)
+
+    def publish(self, data):
+        if not self.has_changed(self.encode(data)):
+            return
+        # Missing keys are left out, the same as with shared memory
+        snapshot = dict((key, value) for key, value in data.iteritems()
+                        if value is not None)
+        self.latest = (self.latest[0] + 1, snapshot)
+        self.ring()
+
+    @property
+    def version(self):
+        return self.latest[0]
+
+    def read(self, last_version=0):
+        self.drain()
+        version, data = self.latest
+        if version == last_version:
+            return last_version, None
+        return version, data
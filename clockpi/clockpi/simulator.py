@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+import argparse
+import logging
+import time
+from datetime import datetime
+from datetime import timedelta
+
+import numpy as np
+
+from clockpi.clock import SimulatedClock
+from clockpi.clockface_config import BACKGROUNDS
+from clockpi.display import FrameDumpDisplay
+from clockpi.display import GifDisplay
+from clockpi.display import NullDisplay
+from clockpi.enums import WeatherType
+from clockpi.external import LATITUDE
+from clockpi.external import LONGITUDE
+from clockpi.external import TrafficAPIClient
+from clockpi.external import WeatherAPIClient
+from clockpi.graphics.graphics import LEDPi
+from clockpi.shared_state import StateChannel
+from clockpi.solar import SunTimesTable
+from clockpi.update_clock_info import ClockInfoUpdater
+
+
+logger = logging.getLogger(__name__)
+
+SECONDS_PER_DAY = 24 * 60 * 60
+# The most frames a GIF can have, since they're all kept in memory until
+# it's saved (three minutes of GIF at 20 FPS)
+GIF_MAX_FRAMES = 3600
+
+
+def scenario_weather(day, forecast=None, current_temp=None, sunrise=None,
+                     sunset=None):
+    """
+    Returns weather like the weather API client sends. `forecast` is the name
+    of a `WeatherType`, and `sunrise` and `sunset` are times of day, which
+    default to the calculated ones for the configured location, or to the
+    default hours if there isn't one.
+    """
+    sun_times = (None, None)
+    if LATITUDE is not None and LONGITUDE is not None:
+        sun_times = SunTimesTable(LATITUDE, LONGITUDE).get(day)
+    if sunrise is not None:
+        sunrise = datetime.combine(day, sunrise)
+    if sunset is not None:
+        sunset = datetime.combine(day, sunset)
+    weather = {
+        'error': False,
+        'current_temp': current_temp,
+        'sunrise': sunrise or sun_times[0],
+        'sunset': sunset or sun_times[1],
+    }
+    if forecast:
+        weather['forecast'] = WeatherType[forecast.upper()]
+    return weather
+
+
+class DaySimulator(object):
+    """
+    Draws a day of the clock on a simulated clock, as fast as frames can be
+    rendered. The API clients are replaced by channels that the scenario's
+    `weather` and `traffic` are published to once, so the rest of the clock
+    runs the same way it does on the Pi.
+    """
+    def __init__(self, day, weather, traffic=None, step=1, background=None):
+        self.start = datetime.combine(day, datetime.min.time())
+        self.step = step
+        self.clock = SimulatedClock(self.start)
+        weather_channel = StateChannel(WeatherAPIClient.FIELDS)
+        traffic_channel = StateChannel(TrafficAPIClient.FIELDS)
+        weather_channel.publish(weather)
+        if traffic:
+            traffic_channel.publish(traffic)
+        clock_info_updater = ClockInfoUpdater(self.clock, weather_channel,
+                                              traffic_channel)
+        self.ledpi = LEDPi(clock_info_updater=clock_info_updater,
+                           clock=self.clock, background=background)
+
+    def run(self, display, duration=SECONDS_PER_DAY):
+        """
+        Sends a frame to `display` every `step` simulated seconds for
+        `duration` seconds. Returns how many times faster than real time it
+        ran.
+        """
+        start_time = time.time()
+        for frame_number in xrange(int(duration // self.step)):
+            self.clock.set(self.start + timedelta(
+                seconds=frame_number * self.step))
+            matrix = self.ledpi.display_clock()
+            if matrix is not None:
+                sent = display.send_matrix(matrix)
+                self.ledpi.metrics.count(
+                    'frames_sent' if sent else 'frames_skipped')
+        display.close()
+        elapsed = time.time() - start_time
+        logger.info("Simulated {} seconds in {:.1f} seconds".format(
+                    duration, elapsed))
+        logger.info(self.ledpi.metrics.format_log())
+        return duration / elapsed if elapsed else float('inf')
+
+
+def parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def parse_time_of_day(value):
+    return datetime.strptime(value, '%H:%M').time()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s [%(levelname)s] in %(funcName)s: %(message)s')
+
+    parser = argparse.ArgumentParser(
+        description='Draws a full day of the clock faster than real time')
+    parser.add_argument('--date', type=parse_date,
+                        default=datetime.now().date(),
+                        help='Day to simulate, as YYYY-MM-DD')
+    parser.add_argument('--forecast', default=None,
+                        choices=[weather_type.name.lower()
+                                 for weather_type in WeatherType])
+    parser.add_argument('--temp', type=int, default=None,
+                        help='Current temperature, leave out for an error')
+    parser.add_argument('--sunrise', type=parse_time_of_day,
+                        help='HH:MM, calculated for the location by default')
+    parser.add_argument('--sunset', type=parse_time_of_day,
+                        help='HH:MM, calculated for the location by default')
+    parser.add_argument('--travel-time', type=int, default=None,
+                        help='Minutes, leave out for no traffic')
+    parser.add_argument('--traffic-delta', type=int, default=0,
+                        help='Minutes of delay from traffic')
+    parser.add_argument('--background', choices=sorted(BACKGROUNDS))
+    parser.add_argument('--step', type=float, default=1,
+                        help='Simulated seconds between frames')
+    parser.add_argument('--duration', type=float, default=SECONDS_PER_DAY,
+                        help='Simulated seconds to draw')
+    parser.add_argument('--output',
+                        help='A .gif file of up to {} frames, or a directory '
+                             'for an image sequence. Frames are thrown away '
+                             'if left out'.format(GIF_MAX_FRAMES))
+    parser.add_argument('--format', choices=('png', 'raw'), default='png',
+                        help='Image sequence format')
+    parser.add_argument('--gif-fps', type=float, default=20)
+    parser.add_argument('--scale', type=int, default=4,
+                        help='How much to scale up GIF frames')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Random seed, so the rain falls the same way')
+    args = parser.parse_args()
+
+    np.random.seed(args.seed)
+    weather = scenario_weather(args.date, args.forecast, args.temp,
+                               args.sunrise, args.sunset)
+    traffic = None
+    if args.travel_time is not None:
+        traffic = {'travel_time': args.travel_time,
+                   'traffic_delta': args.traffic_delta}
+    if args.output is None:
+        display = NullDisplay()
+    elif args.output.lower().endswith('.gif'):
+        if args.duration // args.step > GIF_MAX_FRAMES:
+            parser.error('A GIF can have up to {} frames, use a shorter '
+                         '--duration or a longer --step'.format(
+                             GIF_MAX_FRAMES))
+        display = GifDisplay(args.output, 1000.0 / args.gif_fps, args.scale)
+    else:
+        display = FrameDumpDisplay(args.output, args.format)
+    simulator = DaySimulator(args.date, weather, traffic, args.step,
+                             args.background)
+    speedup = simulator.run(display, args.duration)
+    logger.info("Ran {:.0f} times faster than real time".format(speedup))
@@ -0,0 +1,92 @@
+import math
+from datetime import date
+from datetime import datetime
+from datetime import timedelta
+from dateutil import tz
+
+
+J2000 = 2451545.0  # Julian day of 2000-01-01 12:00 UTC
+J2000_DATETIME = datetime(2000, 1, 1, 12)
+EARTH_AXIAL_TILT = 23.4397  # Degrees
+# The sun is considered up once its top edge clears the horizon, including
+# atmospheric refraction
+SUNRISE_ALTITUDE = -0.833  # Degrees
+
+
+def sun_times_utc(day, latitude, longitude):
+    """
+    Calculates sunrise and sunset for the date `day` at `latitude` and
+    `longitude` (degrees, north and east are positive) using the sunrise
+    equation, which is good to about a minute. Returns naive UTC datetimes as
+    (sunrise, sunset), or (None, None) if the sun doesn't rise or set that
+    day.
+    https://en.wikipedia.org/wiki/Sunrise_equation
+    """
+    days_since_j2000 = (day - J2000_DATETIME.date()).days
+    mean_solar_time = days_since_j2000 - longitude / 360.0
+    mean_anomaly = math.radians(
+        (357.5291 + 0.98560028 * mean_solar_time) % 360)
+    center = (1.9148 * math.sin(mean_anomaly) +
+              0.0200 * math.sin(2 * mean_anomaly) +
+              0.0003 * math.sin(3 * mean_anomaly))
+    ecliptic_longitude = math.radians(
+        (math.degrees(mean_anomaly) + center + 180 + 102.9372) % 360)
+    solar_transit = (J2000 + mean_solar_time +
+                     0.0053 * math.sin(mean_anomaly) -
+                     0.0069 * math.sin(2 * ecliptic_longitude))
+    sin_declination = (math.sin(ecliptic_longitude) *
+                       math.sin(math.radians(EARTH_AXIAL_TILT)))
+    cos_declination = math.cos(math.asin(sin_declination))
+    latitude = math.radians(latitude)
+    cos_hour_angle = (
+        (math.sin(math.radians(SUNRISE_ALTITUDE)) -
+         math.sin(latitude) * sin_declination) /
+        (math.cos(latitude) * cos_declination))
+    if not -1 <= cos_hour_angle <= 1:
+        # Polar day or night
+        return None, None
+    hour_angle = math.degrees(math.acos(cos_hour_angle))
+    sunrise = solar_transit - hour_angle / 360
+    sunset = solar_transit + hour_angle / 360
+    return (J2000_DATETIME + timedelta(days=sunrise - J2000),
+            J2000_DATETIME + timedelta(days=sunset - J2000))
+
+
+class SunTimesTable(object):
+    """
+    Local sunrise and sunset times for every day of a year, worked out
+    offline for the given location. The table for a year is built the first
+    time a day in it is asked for.
+    """
+    def __init__(self, latitude, longitude, local_tz=None):
+        self.latitude = latitude
+        self.longitude = longitude
+        self.local_tz = local_tz or tz.tzlocal()
+        self.year = None
+        self.table = {}  # date -> (sunrise, sunset)
+
+    def _to_local(self, utc_time):
+        if utc_time is None:
+            return None
+        utc_time = utc_time.replace(tzinfo=tz.tzutc())
+        return utc_time.astimezone(self.local_tz).replace(tzinfo=None)
+
+    def build(self, year):
+        self.year = year
+        self.table = {}
+        day = date(year, 1, 1)
+        while day.year == year:
+            sunrise, sunset = sun_times_utc(day, self.latitude,
+                                            self.longitude)
+            self.table[day] = (self._to_local(sunrise),
+                               self._to_local(sunset))
+            day += timedelta(days=1)
+
+    def get(self, day):
+        """
+        Returns the local (naive) sunrise and sunset datetimes for the date
+        `day`, which are None if the sun doesn't rise or set.
+        """
+        if day.year != self.year:
+            self.build(day.year)
+        return self.table[day]
@@ -1,8 +1,8 @@
 import logging
-from datetime import datetime
 from multiprocessing import Process
-from multiprocessing import Pipe
 
+from clockpi.clock import SYSTEM_CLOCK
+from clockpi.constants import API_FETCH_MODE
 from clockpi.constants import BLOOM_START_HOUR_OFFSET
 from clockpi.constants import BLOOM_END_HOUR_OFFSET
 from clockpi.constants import DAILY_R_MIN
@@ -17,16 +17,22 @@ from clockpi.constants import DEFAULT_SUNRISE_HOUR
 from clockpi.constants import DEFAULT_SUNSET_HOUR
 from clockpi.constants import SUN_ANIMATION_DURATION
 from clockpi.enums import WeatherType
+from clockpi.external import APIClientLoop
 from clockpi.external import WeatherAPIClient
 from clockpi.external import TrafficAPIClient
 from clockpi.graphics.color_utils import calc_color_cos
 from clockpi.graphics.color_utils import set_brightness
+from clockpi.shared_state import LocalStateChannel
+from clockpi.shared_state import StateChannel
 from clockpi.secret import DIRECTIONS_END_HOUR
 from clockpi.secret import DIRECTIONS_START_HOUR
 
 
 logger = logging.getLogger(__name__)
 
+# How the API clients can be run, see `ClockInfoUpdater`
+FETCH_MODES = ('process', 'thread')
+
 
 def update_time(clock_info, now):
     second = now.second
@@ -45,21 +51,25 @@ def update_time(clock_info, now):
         clock_info['hour_digits'][0] = 'BLANK'
 
 
-def update_weather(clock_info, now, api_client_pipe):
+def update_weather(clock_info, now, weather_channel):
     clock_info.setdefault('weather', {})
-    if api_client_pipe.poll():
-        clock_info['weather'] = api_client_pipe.recv()
-
-    current_temp = clock_info['weather'].get('current_temp')
-    if current_temp is None:
-        clock_info['temp_digits'] = ['E', 'R']
-    else:
-        # Temp out of range
-        if (current_temp > 99 or current_temp < 0):
-            clock_info['temp_digits'] = ['SKULL']
+    version, weather = weather_channel.read(
+        clock_info.get('weather_version', 0))
+    if weather is not None:
+        clock_info['weather'] = weather
+        clock_info['weather_version'] = version
+    if weather is not None or 'temp_digits' not in clock_info:
+        # Only changes with the weather
+        current_temp = clock_info['weather'].get('current_temp')
+        if current_temp is None:
+            clock_info['temp_digits'] = ['E', 'R']
         else:
-            clock_info['temp_digits'] = map(
-                int, [current_temp / 10 % 10, current_temp % 10])
+            # Temp out of range
+            if (current_temp > 99 or current_temp < 0):
+                clock_info['temp_digits'] = ['SKULL']
+            else:
+                clock_info['temp_digits'] = map(
+                    int, [current_temp / 10 % 10, current_temp % 10])
     sunrise_time = clock_info['weather'].get('sunrise')
     sunset_time = clock_info['weather'].get('sunset')
     if (sunrise_time is None) or (sunset_time is None):
@@ -108,6 +118,50 @@ def update_weather(clock_info, now, api_client_pipe):
                 clock_info['forecast_key'] = 'rain_moon'
 
 
+class DailyColorTable(object):
+    """
+    The clockface's brightness and color for every minute of the day, which
+    only depend on the sunrise and sunset hours. The table is worked out from
+    the constants for a day's colors once, and only rebuilt when the sunrise
+    or sunset hour changes.
+    """
+    MINUTES_PER_DAY = 24 * 60
+
+    def __init__(self):
+        self.sun_hours = None
+        self.table = []  # Minute of the day -> (brightness, color)
+
+    def build(self, sunrise_hour, sunset_hour):
+        self.sun_hours = (sunrise_hour, sunset_hour)
+        bloom_start = (sunrise_hour + BLOOM_START_HOUR_OFFSET) * 60
+        bloom_end = (sunset_hour + BLOOM_END_HOUR_OFFSET) * 60
+        self.table = []
+        for day_elapsed_mins in xrange(self.MINUTES_PER_DAY):
+            brightness = calc_color_cos(
+                day_elapsed_mins, bloom_start, bloom_end,
+                DAILY_BRIGHTNESS_MIN, DAILY_BRIGHTNESS_MAX)
+            red = calc_color_cos(
+                day_elapsed_mins, bloom_start, bloom_end, DAILY_R_MIN,
+                DAILY_R_MAX)
+            green = calc_color_cos(
+                day_elapsed_mins, bloom_start, bloom_end, DAILY_G_MIN,
+                DAILY_G_MAX)
+            blue = calc_color_cos(
+                day_elapsed_mins, bloom_start, bloom_end, DAILY_B_MIN,
+                DAILY_B_MAX)
+            color = set_brightness([red, green, blue], brightness)
+            self.table.append((brightness, tuple(color)))
+
+    def get(self, sunrise_hour, sunset_hour, day_elapsed_mins):
+        """Returns (brightness, color) for the minute of the day"""
+        if self.sun_hours != (sunrise_hour, sunset_hour):
+            self.build(sunrise_hour, sunset_hour)
+        return self.table[day_elapsed_mins]
+
+
+DAILY_COLOR_TABLE = DailyColorTable()
+
+
 def update_color(clock_info, now):
     # Depends on update_weather
     day_elapsed_mins = now.hour * 60 + now.minute
@@ -117,22 +171,13 @@ def update_color(clock_info, now):
         sunrise_hour = clock_info['weather']['sunrise'].hour
     if clock_info.get('weather', {}).get('sunset'):
         sunset_hour = clock_info['weather']['sunset'].hour
-    bloom_start = (sunrise_hour + BLOOM_START_HOUR_OFFSET) * 60
-    bloom_end = (sunset_hour + BLOOM_END_HOUR_OFFSET) * 60
-    clock_info['brightness'] = calc_color_cos(
-        day_elapsed_mins, bloom_start, bloom_end, DAILY_BRIGHTNESS_MIN,
-        DAILY_BRIGHTNESS_MAX)
-    red = calc_color_cos(
-        day_elapsed_mins, bloom_start, bloom_end, DAILY_R_MIN, DAILY_R_MAX)
-    green = calc_color_cos(
-        day_elapsed_mins, bloom_start, bloom_end, DAILY_G_MIN, DAILY_G_MAX)
-    blue = calc_color_cos(
-        day_elapsed_mins, bloom_start, bloom_end, DAILY_B_MIN, DAILY_B_MAX)
-    clock_info['color'] = set_brightness([red, green, blue],
-                                         clock_info['brightness'])
-
-
-def update_traffic(clock_info, now, api_client_pipe):
+    brightness, color = DAILY_COLOR_TABLE.get(sunrise_hour, sunset_hour,
+                                              day_elapsed_mins)
+    clock_info['brightness'] = brightness
+    clock_info['color'] = list(color)
+
+
+def update_traffic(clock_info, now, traffic_channel):
     # Only show traffic around the times I may be going to work
     prev_show_traffic = clock_info.get('show_traffic')
     clock_info['show_traffic'] = (now.hour >= DIRECTIONS_START_HOUR and
@@ -142,11 +187,16 @@ def update_traffic(clock_info, now, api_client_pipe):
         logger.info("Sending traffic client {}".format(
                     clock_info['show_traffic']))
         # Only need to update the api client on a change
-        api_client_pipe.send(clock_info['show_traffic'])
+        traffic_channel.renderer_pipe.send(clock_info['show_traffic'])
     if clock_info['show_traffic']:
         clock_info.setdefault('traffic', {})
-        if api_client_pipe.poll():
-            clock_info['traffic'] = api_client_pipe.recv()
+        version, traffic = traffic_channel.read(
+            clock_info.get('traffic_version', 0))
+        if traffic is None:
+            # The digits only change with the traffic
+            return
+        clock_info['traffic'] = traffic
+        clock_info['traffic_version'] = version
         if clock_info['traffic']:
             clock_info['traffic_delta_digits'] = map(
                 int, [clock_info['traffic']['traffic_delta'] / 10 % 10,
@@ -157,19 +207,57 @@ def update_traffic(clock_info, now, api_client_pipe):
 
 
 class ClockInfoUpdater(object):
-    def __init__(self):
-        self.weather_parent_pipe, weather_child_pipe = Pipe()
-        weather = WeatherAPIClient(weather_child_pipe)
-        self.weather_api_client = Process(target=weather.run_forever)
-        self.weather_api_client.start()
+    """
+    Keeps the clock info up to date with `clock` and the API clients. The
+    clients are started unless the channels to read their data from are
+    given, as in a simulation. With the 'process' `fetch_mode` each client
+    gets its own process, and with 'thread' they all run on one thread of
+    this process. Clock info that comes from the API data is only worked out
+    again when the data changes.
+    """
+    def __init__(self, clock=SYSTEM_CLOCK, weather_channel=None,
+                 traffic_channel=None, fetch_mode=API_FETCH_MODE):
+        if fetch_mode not in FETCH_MODES:
+            raise ValueError("Unknown fetch mode {}".format(fetch_mode))
+        self.clock = clock
+        if fetch_mode == 'process':
+            channel_class = StateChannel
+        else:
+            channel_class = LocalStateChannel
+        clients = []
+        if weather_channel is None:
+            weather_channel = channel_class(WeatherAPIClient.FIELDS)
+            clients.append(WeatherAPIClient(weather_channel))
+        self.weather_channel = weather_channel
+
+        if traffic_channel is None:
+            traffic_channel = channel_class(TrafficAPIClient.FIELDS)
+            clients.append(TrafficAPIClient(traffic_channel))
+        self.traffic_channel = traffic_channel
+
+        self.api_client_processes = []
+        self.api_client_loop = None
+        if fetch_mode == 'process':
+            for client in clients:
+                process = Process(target=client.run_forever)
+                process.start()
+                self.api_client_processes.append(process)
+        elif clients:
+            self.api_client_loop = APIClientLoop(clients)
+            self.api_client_loop.start()
 
-        self.traffic_parent_pipe, traffic_child_pipe = Pipe()
-        traffic = TrafficAPIClient(traffic_child_pipe)
-        self.traffic_api_client = Process(target=traffic.run_forever)
-        self.traffic_api_client.start()
+    def data_connections(self, clock_info):
+        """
+        Returns the pipes that are rung when new API data is published, and
+        that will be read by the next `run`
+        """
+        connections = [self.weather_channel.renderer_pipe]
+        if clock_info.get('show_traffic'):
+            connections.append(self.traffic_channel.renderer_pipe)
+        return connections
 
     def run(self, clock_info, update_freq):
-        now = datetime.now()
+        now = self.clock.now()
         last_update = clock_info.get('last_update_time')
         if last_update:
             update_time_delta = now - last_update
@@ -177,7 +265,7 @@ class ClockInfoUpdater(object):
                 return False
         clock_info['last_update_time'] = now
         update_time(clock_info, now)
-        update_weather(clock_info, now, self.weather_parent_pipe)
+        update_weather(clock_info, now, self.weather_channel)
         update_color(clock_info, now)
-        update_traffic(clock_info, now, self.traffic_parent_pipe)
+        update_traffic(clock_info, now, self.traffic_channel)
         return True
@@ -1,13 +1,10 @@
+import numpy as np
 from PIL import Image
-from PIL import ImageDraw
 
 
 def send_matrix(driver, matrix):
-    image = Image.new('RGB', (64, 32))
-    draw = ImageDraw.Draw(image)
-    for ii in xrange(len(matrix)):
-        for jj in xrange(len(matrix[0])):
-            pixel = matrix[ii][jj]
-            draw.point((ii, jj), fill=tuple(pixel))
-    driver.Clear()
+    # The matrix is indexed [x][y], but images are indexed [y][x]
+    image = Image.fromarray(np.ascontiguousarray(matrix.swapaxes(0, 1)),
+                            'RGB')
+    # The image covers the whole display, so there's no need to clear it first
     driver.SetImage(image, 0, 0)